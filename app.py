@@ -1,16 +1,40 @@
+import glob
+import os
 from dash import Dash
 from layout import create_layout
 from callbacks import register_callbacks
+from evaluate import register_evaluation
+from library import DEFAULT_LIBRARY_PATH, ColormapLibrary
+from metrics import METRICS, register_metrics
+from state import DiskStore, MemoryStore
+from thumbnails import DEFAULT_THUMBNAIL_DIR, ThumbnailCache, register_thumbnails
 
 # Initialize Dash app
 app = Dash(__name__)
 app.title = "Interactive Colormap Builder"
+server = app.server
 
-# Define the layout
-app.layout = create_layout()
+# Define the layout (a function, so every page load gets a fresh session id)
+app.layout = create_layout
 
-# Register callbacks
-register_callbacks(app)
+# Keep session state on disk when several worker processes serve the app
+session_dir = os.environ.get("COLORMAP_SESSION_DIR")
+store = DiskStore(session_dir) if session_dir else MemoryStore()
+
+# Saved colormaps live in one SQLite library; pick up older colormap_NN.json files once
+library = ColormapLibrary(os.environ.get("COLORMAP_LIBRARY", DEFAULT_LIBRARY_PATH))
+if not len(library):
+    library.import_files(sorted(glob.glob("colormap_*.json")))
+
+# Dump a cProfile of callbacks slower than COLORMAP_PROFILE_SLOW seconds
+if os.environ.get("COLORMAP_PROFILE_SLOW"):
+    METRICS.profile_threshold = float(os.environ["COLORMAP_PROFILE_SLOW"])
+
+# Register callbacks, the /metrics endpoint, the dropdown thumbnails and the color endpoint
+register_callbacks(app, store, library, METRICS)
+register_metrics(app, METRICS)
+register_thumbnails(app, library, ThumbnailCache(os.environ.get("COLORMAP_THUMBNAIL_DIR", DEFAULT_THUMBNAIL_DIR)))
+register_evaluation(app, library)
 
 # Run the app
 if __name__ == "__main__":
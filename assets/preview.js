@@ -0,0 +1,287 @@
+// Clientside preview of the colormap strip.
+//
+// A port of the interval edits in intervals.py (IntervalColormap.insert,
+// trim_and_expand, merge_runs and normalize_colormap), run in the browser so
+// that editing the range, color and bounds inputs redraws the preview strip
+// without a request to the server. tests/test_preview.py checks it against
+// the Python versions with node.
+
+(function () {
+    "use strict";
+
+    // Cells a gradient interval is drawn with, as GRADIENT_CELLS in callbacks.py
+    var GRADIENT_CELLS = 32;
+    var STRIP_WIDTH = 20;
+    var MAX_TICKS = 20;
+
+    function bisectLeft(values, x) {
+        var lo = 0, hi = values.length;
+        while (lo < hi) {
+            var mid = (lo + hi) >> 1;
+            if (values[mid] < x) lo = mid + 1; else hi = mid;
+        }
+        return lo;
+    }
+
+    function bisectRight(values, x) {
+        var lo = 0, hi = values.length;
+        while (lo < hi) {
+            var mid = (lo + hi) >> 1;
+            if (x < values[mid]) hi = mid; else lo = mid + 1;
+        }
+        return lo;
+    }
+
+    // Palette entries are color names or gradient objects, compared by value
+    function colorKey(color) {
+        if (typeof color === "string") return "s:" + color;
+        return ["g", color.color, color.end_color, color.start, color.end, color.space].join(":");
+    }
+
+    // Build {starts, ends, codes, palette} from the preview-data store
+    function fromData(data) {
+        var colormap = {
+            starts: data.starts.slice(),
+            ends: data.ends.slice(),
+            codes: data.codes.slice(),
+            palette: data.palette.slice(),
+            index: {}
+        };
+        colormap.palette.forEach(function (color, code) {
+            colormap.index[colorKey(color)] = code;
+        });
+        return colormap;
+    }
+
+    function code(colormap, color) {
+        var key = colorKey(color);
+        if (!(key in colormap.index)) {
+            colormap.index[key] = colormap.palette.length;
+            colormap.palette.push(color);
+        }
+        return colormap.index[key];
+    }
+
+    function overlapSpan(colormap, lo, hi) {
+        var i = bisectRight(colormap.ends, lo);
+        var j = bisectLeft(colormap.starts, hi);
+        return [i, Math.max(i, j)];
+    }
+
+    function splice(colormap, i, j, starts, ends, codes) {
+        Array.prototype.splice.apply(colormap.starts, [i, j - i].concat(starts));
+        Array.prototype.splice.apply(colormap.ends, [i, j - i].concat(ends));
+        Array.prototype.splice.apply(colormap.codes, [i, j - i].concat(codes));
+    }
+
+    // IntervalColormap.insert: paint [lo, hi] with color, splitting what it overlaps
+    function insert(colormap, color, lo, hi) {
+        if (lo > hi) throw new Error("Interval min " + lo + " is greater than max " + hi);
+        var starts = colormap.starts, ends = colormap.ends, codes = colormap.codes;
+        var newCode = code(colormap, color);
+        var span = overlapSpan(colormap, lo, hi), i = span[0], j = span[1];
+        var newStarts = [], newEnds = [], newCodes = [];
+        if (i < j && starts[i] < lo) {
+            newStarts.push(starts[i]);
+            newEnds.push(lo);
+            newCodes.push(codes[i]);
+        }
+        newStarts.push(lo);
+        newEnds.push(hi);
+        newCodes.push(newCode);
+        if (i < j && ends[j - 1] > hi) {
+            newStarts.push(hi);
+            newEnds.push(ends[j - 1]);
+            newCodes.push(codes[j - 1]);
+        }
+        splice(colormap, i, j, newStarts, newEnds, newCodes);
+    }
+
+    // IntervalColormap.merge_runs: merge consecutive intervals that share a color
+    function mergeRuns(colormap) {
+        var starts = colormap.starts, ends = colormap.ends, codes = colormap.codes;
+        if (codes.length < 2) return;
+        var keep = 0;
+        for (var k = 1; k < codes.length; k++) {
+            if (codes[k] === codes[keep]) {
+                ends[keep] = ends[k];
+            } else {
+                keep += 1;
+                starts[keep] = starts[k];
+                ends[keep] = ends[k];
+                codes[keep] = codes[k];
+            }
+        }
+        starts.length = ends.length = codes.length = keep + 1;
+    }
+
+    // IntervalColormap.trim_and_expand: clip to [lo, hi] and pad the ends with background
+    function trimAndExpand(colormap, lo, hi, background) {
+        var span = overlapSpan(colormap, lo, hi), i = span[0], j = span[1];
+        var starts = colormap.starts = colormap.starts.slice(i, j);
+        var ends = colormap.ends = colormap.ends.slice(i, j);
+        var codes = colormap.codes = colormap.codes.slice(i, j);
+        var backgroundCode = code(colormap, background);
+        if (!starts.length) {
+            starts.push(lo);
+            ends.push(hi);
+            codes.push(backgroundCode);
+        } else {
+            if (starts[0] < lo) {
+                starts[0] = lo;
+            } else if (starts[0] > lo) {
+                ends.unshift(starts[0]);
+                starts.unshift(lo);
+                codes.unshift(backgroundCode);
+            }
+            var last = ends.length - 1;
+            if (ends[last] > hi) {
+                ends[last] = hi;
+            } else if (ends[last] < hi) {
+                starts.push(ends[last]);
+                ends.push(hi);
+                codes.push(backgroundCode);
+            }
+        }
+        mergeRuns(colormap);
+    }
+
+    // normalize_colormap: map interval bounds (and gradient anchors) from [lo, hi] to [0, 1]
+    function normalize(colormap, lo, hi) {
+        var totalRange = hi - lo;
+        return colormap.codes.map(function (c, k) {
+            var color = colormap.palette[c];
+            if (typeof color !== "string") {
+                color = {
+                    color: color.color,
+                    end_color: color.end_color,
+                    start: (color.start - lo) / totalRange,
+                    end: (color.end - lo) / totalRange,
+                    space: color.space
+                };
+            }
+            return {
+                color: color,
+                min: (colormap.starts[k] - lo) / totalRange,
+                max: (colormap.ends[k] - lo) / totalRange
+            };
+        });
+    }
+
+    function toDicts(colormap) {
+        return colormap.codes.map(function (c, k) {
+            return [colormap.palette[c], colormap.starts[k], colormap.ends[k]];
+        });
+    }
+
+    // One line trace per interval; gradients are a heatmap row interpolated by Plotly in RGB
+    function stripTrace(entry) {
+        var color = entry.color;
+        if (typeof color === "string") {
+            return {
+                type: "scatter",
+                x: [entry.min, entry.max],
+                y: [1, 1],
+                mode: "lines",
+                line: {color: color, width: STRIP_WIDTH},
+                showlegend: false,
+                hoverinfo: "skip"
+            };
+        }
+        var x = [], z = [];
+        var span = color.end - color.start;
+        for (var k = 0; k <= GRADIENT_CELLS; k++) {
+            x.push(entry.min + (entry.max - entry.min) * k / GRADIENT_CELLS);
+        }
+        for (k = 0; k < GRADIENT_CELLS; k++) {
+            var center = (x[k] + x[k + 1]) / 2;
+            z.push(span > 0 ? Math.min(1, Math.max(0, (center - color.start) / span)) : 0);
+        }
+        return {
+            type: "heatmap",
+            x: x,
+            y: [0.5, 1.5],
+            z: [z],
+            colorscale: [[0, color.color], [1, color.end_color]],
+            zmin: 0,
+            zmax: 1,
+            showscale: false,
+            hoverinfo: "skip"
+        };
+    }
+
+    function figure(colormap, lo, hi, message) {
+        var normalized = normalize(colormap, lo, hi);
+        var ticks = [];
+        normalized.forEach(function (entry) {
+            [entry.min, entry.max].forEach(function (t) {
+                if (!ticks.length || ticks[ticks.length - 1] !== t) ticks.push(t);
+            });
+        });
+        var step = Math.ceil(ticks.length / MAX_TICKS) || 1;
+        ticks = ticks.filter(function (_, k) { return k % step === 0; });
+        var plotHeight = 120 - 10 - 40;
+        var halfRange = plotHeight / STRIP_WIDTH / 2;
+        return {
+            data: normalized.map(stripTrace),
+            layout: {
+                xaxis: {
+                    range: [0, 1],
+                    tickvals: ticks,
+                    ticktext: ticks.map(function (t) { return (lo + t * (hi - lo)).toFixed(2); }),
+                    showgrid: false,
+                    zeroline: false,
+                    fixedrange: true
+                },
+                yaxis: {visible: false, fixedrange: true, range: [1 - halfRange, 1 + halfRange]},
+                height: 120,
+                margin: {l: 20, r: 20, t: 10, b: 40},
+                annotations: message ? [{text: message, showarrow: false, xref: "paper", yref: "paper", x: 0.5, y: 1}] : []
+            }
+        };
+    }
+
+    // Clientside callback: the strip as it would look after Apply Bounds and Add Color
+    function preview(color, endColor, space, minRange, maxRange, newMin, newMax, data) {
+        if (!data) {
+            return {data: [], layout: {height: 120, xaxis: {visible: false}, yaxis: {visible: false},
+                annotations: [{text: "No preview for colormaps this large", showarrow: false}]}};
+        }
+        var colormap = fromData(data);
+        var lo = data.mincolormap, hi = data.maxcolormap;
+        var changes = [];
+        if (typeof newMin === "number" && typeof newMax === "number" && newMin < newMax
+                && (newMin !== lo || newMax !== hi)) {
+            trimAndExpand(colormap, newMin, newMax, data.background);
+            lo = newMin;
+            hi = newMax;
+            changes.push("bounds " + lo + " to " + hi);
+        }
+        if (color && typeof minRange === "number" && typeof maxRange === "number" && minRange <= maxRange) {
+            var paint = color;
+            if (endColor) {
+                paint = {color: color, end_color: endColor, start: minRange, end: maxRange, space: space || "rgb"};
+            }
+            insert(colormap, paint, minRange, maxRange);
+            changes.push((endColor ? color + " → " + endColor : color) + " on [" + minRange + ", " + maxRange + "]");
+        }
+        return figure(colormap, lo, hi, changes.length ? "Preview: " + changes.join(", ") : "");
+    }
+
+    var api = {
+        insert: insert,
+        trimAndExpand: trimAndExpand,
+        mergeRuns: mergeRuns,
+        normalize: normalize,
+        fromData: fromData,
+        toDicts: toDicts,
+        preview: preview
+    };
+
+    if (typeof window !== "undefined") {
+        window.dash_clientside = Object.assign({}, window.dash_clientside, {colormap: api});
+    }
+    if (typeof module !== "undefined" && module.exports) {
+        module.exports = api;
+    }
+})();
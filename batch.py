@@ -0,0 +1,156 @@
+"""Replay colormap edit streams from JSONL files without running the Dash app.
+
+Each line of an input file is one edit, applied with the same logic as the UI:
+
+    {"op": "add", "color": "red", "min": 10, "max": 20}
+    {"op": "add", "color": "red", "end_color": "blue", "space": "oklab", "min": 10, "max": 20}
+    {"op": "add_many", "intervals": [{"color": "red", "min": 10, "max": 20}, ...]}
+    {"op": "bounds", "min": 0, "max": 100}
+    {"op": "background", "color": "black"}
+    {"op": "save", "name": "my_colormap"}
+    {"op": "reset"}
+
+Every "save" emits the current colormap (named <file>_NN when no name is
+given). A file without any "save" emits its final colormap as <file>.json.
+
+    python batch.py edits/*.jsonl --output-dir colormaps --jobs 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from files import write_atomic
+from gradients import Gradient, entry_color
+from state import (
+    ColormapState,
+    add_intervals,
+    check_ranges,
+    replace_background_color,
+    trim_and_expand_colormap,
+    update_intervals,
+)
+
+
+class EditError(ValueError):
+    """An edit line that cannot be applied."""
+
+
+def _checked_ranges(rows):
+    try:
+        return check_ranges(rows)
+    except ValueError as error:
+        raise EditError(str(error)) from None
+
+
+def apply_edit(state, edit):
+    """Apply one edit dict to state; return the new state (reset replaces it)."""
+    op = edit.get("op")
+    if op == "add":
+        # Also rejects NaN and infinite bounds, which json.loads accepts
+        [(color, lo, hi)] = _checked_ranges([(edit["color"], edit["min"], edit["max"])])
+        if edit.get("end_color"):
+            color = Gradient(color, edit["end_color"], lo, hi, edit.get("space", "rgb"))
+        update_intervals(state, color, lo, hi)
+    elif op == "add_many":
+        ranges = _checked_ranges((entry_color(entry), entry["min"], entry["max"]) for entry in edit["intervals"])
+        add_intervals(state, ranges)
+    elif op == "bounds":
+        [(_, lo, hi)] = _checked_ranges([("bounds", edit["min"], edit["max"])])
+        if not lo < hi:
+            raise EditError(f"bounds min {lo} must be less than max {hi}")
+        state.mincolormap, state.maxcolormap = lo, hi
+        trim_and_expand_colormap(state, lo, hi)
+    elif op == "background":
+        if edit["color"] != state.background_color:
+            replace_background_color(state, edit["color"])
+    elif op == "reset":
+        state = ColormapState()
+    elif op != "save":
+        raise EditError(f"unknown op {op!r}")
+    return state
+
+
+def replay(lines, stem="colormap"):
+    """Replay JSONL edit lines, yielding (name, colormap) for every save."""
+    state = ColormapState()
+    saves = 0
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            edit = json.loads(line)
+            state = apply_edit(state, edit)
+        except (ValueError, KeyError, TypeError) as error:
+            raise EditError(f"line {line_number}: {error}") from error
+        if edit.get("op") == "save":
+            saves += 1
+            yield edit.get("name") or f"{stem}_{saves:02d}", state.to_colormap()
+    if not saves:
+        yield stem, state.to_colormap()
+
+
+def replay_file(path, output_dir, library_path=None):
+    """Replay one JSONL file and write its colormaps; return the names written."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    library = None
+    if library_path:
+        from library import ColormapLibrary
+        library = ColormapLibrary(library_path)
+
+    names = []
+    with open(path) as file:
+        for name, colormap in replay(file, stem):
+            write_atomic(os.path.join(output_dir, f"{name}.json"), json.dumps(colormap, indent=4).encode())
+            if library is not None:
+                library.save(colormap, name)
+            names.append(name)
+    return names
+
+
+def _replay_job(args):
+    path, output_dir, library_path = args
+    try:
+        return path, replay_file(path, output_dir, library_path), None
+    except (OSError, EditError) as error:
+        return path, [], str(error)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay colormap edit streams from JSONL files.")
+    parser.add_argument("inputs", nargs="+", help="JSONL files of edit operations")
+    parser.add_argument("--output-dir", default="batch_output", help="directory for the emitted colormap JSON files")
+    parser.add_argument("--library", help="also save the colormaps into this SQLite colormap library")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = [(path, args.output_dir, args.library) for path in args.inputs]
+    start = time.perf_counter()
+    if args.jobs <= 1 or len(jobs) == 1:
+        results = map(_replay_job, jobs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=args.jobs)
+        results = executor.map(_replay_job, jobs, chunksize=max(1, len(jobs) // (args.jobs * 4)))
+
+    emitted = failed = 0
+    try:
+        for path, names, error in results:
+            if error:
+                failed += 1
+                print(f"{path}: {error}", file=sys.stderr)
+            emitted += len(names)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    elapsed = time.perf_counter() - start
+    print(f"{len(jobs)} files, {emitted} colormaps, {failed} failed in {elapsed:.2f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""Benchmarks for the interval algorithms and figure generation.
+
+Every workload runs on seeded synthetic colormaps, so results are
+comparable between commits:
+
+    python benchmark.py --output bench.json
+    python benchmark.py --sizes 10 1000 --compare bench.json
+
+Each result records the best wall time over --repeat runs, the peak
+memory allocated during one extra run (tracemalloc) and, for figure
+workloads, the size of the serialized figure.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from intervals import IntervalColormap, normalize_colormap
+from state import ColormapState, trim_and_expand_colormap, update_intervals
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+COLORS = ["red", "blue", "green", "orange", "purple", "yellow", "cyan", "magenta", "gray", "brown"]
+# Value range the synthetic colormaps are built in
+SPAN = 1_000_000
+# Slowdowns smaller than this many seconds are treated as timing noise
+NOISE_FLOOR = 0.001
+
+
+def build_state(size, seed=0):
+    """Return a state holding about size intervals, built without timing it."""
+    rng = random.Random(seed)
+    width = SPAN / size
+    starts, ends, codes = [], [], []
+    for k in range(size):
+        starts.append(k * width)
+        ends.append((k + 1) * width)
+        codes.append(rng.randrange(len(COLORS)))
+    colormap = IntervalColormap(starts, ends, codes, COLORS)
+    return ColormapState(colormap, mincolormap=0, maxcolormap=SPAN)
+
+
+def random_inserts(size, seed):
+    """Prepare size narrow inserts at random positions into an empty colormap."""
+    rng = random.Random(seed)
+    edits = []
+    for _ in range(size):
+        lo = rng.uniform(0, SPAN)
+        edits.append((rng.choice(COLORS), lo, lo + rng.uniform(0, 2 * SPAN / size)))
+    state = ColormapState(mincolormap=0, maxcolormap=SPAN)
+
+    def run():
+        for color, lo, hi in edits:
+            update_intervals(state, color, lo, hi)
+    return run
+
+
+def overlapping_inserts(size, seed):
+    """Prepare 100 wide inserts, each covering ~10% of a size-interval colormap."""
+    rng = random.Random(seed)
+    state = build_state(size, seed)
+    edits = []
+    for _ in range(100):
+        lo = rng.uniform(0, 0.9 * SPAN)
+        edits.append((rng.choice(COLORS), lo, lo + 0.1 * SPAN))
+
+    def run():
+        for color, lo, hi in edits:
+            update_intervals(state, color, lo, hi)
+    return run
+
+
+def bound_changes(size, seed):
+    """Prepare 20 alternating shrink/expand bound changes on a size-interval colormap."""
+    state = build_state(size, seed)
+    bounds = [(SPAN * 0.01 * k, SPAN * (1 - 0.01 * k)) for k in range(10)]
+    bounds += list(reversed(bounds))
+
+    def run():
+        for lo, hi in bounds:
+            state.mincolormap, state.maxcolormap = lo, hi
+            trim_and_expand_colormap(state, lo, hi)
+    return run
+
+
+def normalize(size, seed):
+    """Prepare normalize_colormap on a size-interval colormap."""
+    state = build_state(size, seed)
+    return lambda: normalize_colormap(state.colormap_data, 0, SPAN)
+
+
+def figure(size, seed):
+    """Prepare generate_colormap plus JSON serialization of the figure."""
+    from callbacks import generate_colormap
+
+    state = build_state(size, seed)
+    return lambda: generate_colormap(state.colormap_data, 0, SPAN).to_json()
+
+
+WORKLOADS = {
+    "random_inserts": random_inserts,
+    "overlapping_inserts": overlapping_inserts,
+    "bound_changes": bound_changes,
+    "normalize_colormap": normalize,
+    "generate_colormap": figure,
+}
+# Workloads that need dash and plotly installed
+FIGURE_WORKLOADS = {"generate_colormap"}
+
+
+def measure(workload, size, repeat, seed):
+    """Return the best time, peak memory and output size of one workload."""
+    seconds = float("inf")
+    for _ in range(repeat):
+        run = WORKLOADS[workload](size, seed)
+        start = time.perf_counter()
+        result = run()
+        seconds = min(seconds, time.perf_counter() - start)
+
+    run = WORKLOADS[workload](size, seed)
+    tracemalloc.start()
+    run()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    payload_bytes = len(result.encode()) if isinstance(result, str) else None
+    return {
+        "workload": workload,
+        "size": size,
+        "seconds": seconds,
+        "peak_bytes": peak_bytes,
+        "payload_bytes": payload_bytes,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print results next to a baseline run; return the number of regressions."""
+    previous = {(r["workload"], r["size"]): r for r in baseline["results"]}
+    regressions = 0
+    print(f"{'workload':<22}{'size':>8}{'before':>12}{'after':>12}{'ratio':>8}")
+    for result in results:
+        before = previous.get((result["workload"], result["size"]))
+        if before is None:
+            continue
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+        slower = result["seconds"] - before["seconds"] > NOISE_FLOOR
+        flag = "  REGRESSION" if ratio > threshold and slower else ""
+        regressions += bool(flag)
+        print(
+            f"{result['workload']:<22}{result['size']:>8}"
+            f"{before['seconds']:>12.5f}{result['seconds']:>12.5f}{ratio:>8.2f}{flag}"
+        )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the colormap interval algorithms and figures.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="interval counts to run")
+    parser.add_argument("--workloads", nargs="+", choices=sorted(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per workload; the best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="time ratio flagged as a regression")
+    args = parser.parse_args(argv)
+
+    workloads = list(args.workloads)
+    try:
+        import callbacks  # noqa: F401
+    except ImportError as error:
+        print(f"skipping figure workloads: {error}", file=sys.stderr)
+        workloads = [w for w in workloads if w not in FIGURE_WORKLOADS]
+
+    results = []
+    for workload in workloads:
+        for size in args.sizes:
+            result = measure(workload, size, args.repeat, args.seed)
+            results.append(result)
+            payload = f"  {result['payload_bytes']} B" if result["payload_bytes"] is not None else ""
+            print(
+                f"{workload:<22}{size:>8}  {result['seconds'] * 1000:10.2f} ms"
+                f"  {result['peak_bytes'] / 1024:10.1f} KiB peak{payload}",
+                file=sys.stderr,
+            )
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=4)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,114 +1,285 @@
-import json
-from dash import Input, Output, State, ctx, html, no_update
-import plotly.graph_objects as go
-
-# Global variables for colormap data
-colormap_data = [{"color": "white", "min": 0, "max": 100}]
-saved_colormaps = {}
-background_color = "white"
-mincolormap = 0
-maxcolormap = 100
-
-def replace_background_color(new_bg_color):
-    """Replace the background color in the colormap."""
-    global colormap_data, background_color
-    for entry in colormap_data:
-        if entry["color"] == background_color:
-            entry["color"] = new_bg_color
-    background_color = new_bg_color
-
-def update_intervals(new_color, new_min, new_max):
-    """Update colormap intervals dynamically based on new input."""
-    global colormap_data
-    updated_data = []
-
-    for entry in colormap_data:
-        if entry["max"] <= new_min or entry["min"] >= new_max:
-            # Keep intervals that are completely outside the new range
-            updated_data.append(entry)
-        else:
-            # Adjust or split overlapping intervals
-            if entry["min"] < new_min:
-                updated_data.append({"color": entry["color"], "min": entry["min"], "max": new_min})
-            if entry["max"] > new_max:
-                updated_data.append({"color": entry["color"], "min": new_max, "max": entry["max"]})
-
-    # Insert the new interval
-    updated_data.append({"color": new_color, "min": new_min, "max": new_max})
-    updated_data.sort(key=lambda x: x["min"])
-
-    colormap_data = updated_data
-
-def trim_and_expand_colormap(new_mincolormap, new_maxcolormap):
-    """Trim or expand the colormap based on new bounds."""
-    global colormap_data, background_color
-
-    updated_data = []
-
-    for entry in colormap_data:
-        if entry["max"] < new_mincolormap or entry["min"] > new_maxcolormap:
-            # Remove intervals completely outside the bounds
-            continue
-        if entry["min"] < new_mincolormap and entry["max"] > new_mincolormap:
-            # Adjust the min to the new mincolormap
-            entry["min"] = new_mincolormap
-        if entry["max"] > new_maxcolormap and entry["min"] < new_maxcolormap:
-            # Adjust the max to the new maxcolormap
-            entry["max"] = new_maxcolormap
-        updated_data.append(entry)
-
-    # Add background color if needed
-    if updated_data and updated_data[0]["min"] > new_mincolormap:
-        updated_data.insert(0, {"color": background_color, "min": new_mincolormap, "max": updated_data[0]["min"]})
-    elif not updated_data:
-        updated_data = [{"color": background_color, "min": new_mincolormap, "max": new_maxcolormap}]
-
-    if updated_data and updated_data[-1]["max"] < new_maxcolormap:
-        updated_data.append({"color": background_color, "min": updated_data[-1]["max"], "max": new_maxcolormap})
-
-    # Merge consecutive background color intervals
-    merged_data = []
-    for entry in updated_data:
-        if merged_data and entry["color"] == merged_data[-1]["color"]:
-            merged_data[-1]["max"] = entry["max"]
-        else:
-            merged_data.append(entry)
-
-    colormap_data = merged_data
-
-def normalize_colormap(new_mincolormap, new_maxcolormap):
-    """Normalize the colormap to fit within a fixed length, ensuring min and max are constant."""
-    global colormap_data
+import base64
+import uuid
+from bisect import bisect_left, bisect_right
 
+from dash import ClientsideFunction, Input, Output, Patch, State, ctx, html, no_update
+import numpy as np
+import plotly.graph_objects as go
+from export import colormap_hash
+from gradients import Gradient, color_label, css_color
+from intervals import IntervalColormap, normalize_colormap
+from layout import INFO_PAGE_SIZE
+from library import ColormapLibrary, LibraryWriter
+from metrics import METRICS
+from thumbnails import THUMBNAIL_HEIGHT, THUMBNAIL_WIDTH, thumbnail_url
+from state import (
+    ColormapState,
+    MemoryStore,
+    add_intervals,
+    parse_interval_ranges,
+    preview_data,
+    replace_background_color,
+    trim_and_expand_colormap,
+    update_intervals,
+)
+
+# Colormaps with more intervals than this are drawn as a single heatmap trace
+SINGLE_TRACE_THRESHOLD = 200
+# Height in pixels of the colormap strip
+STRIP_WIDTH = 20
+# Horizontal resolution the strip is drawn at when zoomed; finer intervals are merged
+STRIP_PIXELS = 1200
+# Colormaps with more intervals than this are always drawn at STRIP_PIXELS resolution
+LOD_THRESHOLD = STRIP_PIXELS
+# Most tick labels drawn at STRIP_PIXELS resolution
+MAX_TICKS = 20
+# Flat cells a gradient interval is drawn with
+GRADIENT_CELLS = 32
+# Largest colormap sent to the browser for the clientside preview
+PREVIEW_MAX_INTERVALS = LOD_THRESHOLD
+# DataTable filter operators, as the word the query uses followed by its symbol aliases
+FILTER_OPERATORS = [["ge ", ">="], ["le ", "<="], ["lt ", "<"], ["gt ", ">"], ["ne ", "!="], ["eq ", "="], ["contains "]]
+
+def strip_colorscale(palette):
+    """Return a stepped colorscale mapping each palette index to its color.
+
+    Gradients map to their start color; gradient_overlay draws them on top.
+    """
+    colorscale = []
+    for code, color in enumerate(palette):
+        if isinstance(color, Gradient):
+            color = color.color
+        colorscale.append([code / len(palette), color])
+        colorscale.append([(code + 1) / len(palette), color])
+    return colorscale or [[0, "white"], [1, "white"]]
+
+def gradient_cells(entry):
+    """Return the cell edges and RGBA colors drawing a normalized gradient interval."""
+    edges = np.linspace(entry["min"], entry["max"], GRADIENT_CELLS + 1)
+    return edges, entry["color"]((edges[:-1] + edges[1:]) / 2)
+
+def cell_colorscale(colors):
+    """Return a stepped colorscale giving cell k of a heatmap colors[k]."""
+    colorscale = []
+    for k, rgba in enumerate(colors):
+        color = css_color(rgba)
+        colorscale.append([k / len(colors), color])
+        colorscale.append([(k + 1) / len(colors), color])
+    return colorscale
+
+def heatmap_cells(colormap_data, new_mincolormap, new_maxcolormap, k0=0, k1=None):
+    """Return normalized edges, z codes and hover colors for intervals k0..k1.
+
+    Each interval takes two heatmap cells: the (possibly empty) gap before it and
+    the interval itself, so interval k always owns z[2k:2k + 2] and x[2k + 1:2k + 3].
+    """
     total_range = new_maxcolormap - new_mincolormap
-    normalized_data = []
+    palette = colormap_data.palette
+    edges, z, colors = [], [], []
+    for k in range(k0, len(colormap_data) if k1 is None else k1):
+        edges.append((colormap_data.starts[k] - new_mincolormap) / total_range)
+        edges.append((colormap_data.ends[k] - new_mincolormap) / total_range)
+        z.extend((None, colormap_data.codes[k]))
+        colors.extend(("", color_label(palette[colormap_data.codes[k]])))
+    return edges, z, colors
+
+def generate_strip_heatmap(colormap_data, new_mincolormap, new_maxcolormap):
+    """Draw all intervals as one heatmap row with a discrete colorscale."""
+    # Heatmap x values are cell edges; gaps between intervals are empty cells
+    edges, z, colors = heatmap_cells(colormap_data, new_mincolormap, new_maxcolormap)
+    return go.Heatmap(
+        x=edges[:1] + edges,
+        y=[0.5, 1.5],
+        z=[z],
+        customdata=[colors],
+        colorscale=strip_colorscale(colormap_data.palette),
+        zmin=-0.5,
+        zmax=len(colormap_data.palette) - 0.5,
+        showscale=False,
+        hovertemplate="%{customdata}<extra></extra>",
+    )
 
-    for entry in colormap_data:
-        normalized_min = (entry["min"] - new_mincolormap) / total_range
-        normalized_max = (entry["max"] - new_mincolormap) / total_range
-        normalized_data.append({"color": entry["color"], "min": normalized_min, "max": normalized_max})
+def gradient_overlay(colormap_data, new_mincolormap, new_maxcolormap):
+    """Draw every gradient interval as one heatmap row, for the single-trace strip.
 
-    return normalized_data
+    Returns None when no interval is painted with a gradient.
+    """
+    normalized_data = normalize_colormap(colormap_data, new_mincolormap, new_maxcolormap)
+    x, z, labels, colors = [], [], [], []
+    for entry in normalized_data:
+        if not isinstance(entry["color"], Gradient):
+            continue
+        edges, cell_colors = gradient_cells(entry)
+        if not x:
+            x.append(edges[0])
+        # An empty cell covers the gap before each interval, as in heatmap_cells
+        x.extend(edges.tolist())
+        z.append(None)
+        z.extend(range(len(colors), len(colors) + GRADIENT_CELLS))
+        labels.append("")
+        labels.extend([str(entry["color"])] * GRADIENT_CELLS)
+        colors.extend(cell_colors)
+    if not colors:
+        return None
+    return go.Heatmap(
+        x=x,
+        y=[0.5, 1.5],
+        z=[z],
+        customdata=[labels],
+        colorscale=cell_colorscale(colors),
+        zmin=-0.5,
+        zmax=len(colors) - 0.5,
+        showscale=False,
+        hovertemplate="%{customdata}<extra></extra>",
+    )
 
-def generate_colormap(new_mincolormap, new_maxcolormap):
-    """Generate a Plotly figure for the colormap."""
-    normalized_data = normalize_colormap(new_mincolormap, new_maxcolormap)
-    fig = go.Figure()
+def strip_trace(entry):
+    """Draw one normalized interval as a thick line, or a gradient as a row of cells."""
+    if isinstance(entry["color"], Gradient):
+        edges, colors = gradient_cells(entry)
+        return go.Heatmap(
+            x=edges.tolist(),
+            y=[0.5, 1.5],
+            z=[list(range(GRADIENT_CELLS))],
+            colorscale=cell_colorscale(colors),
+            zmin=-0.5,
+            zmax=GRADIENT_CELLS - 0.5,
+            showscale=False,
+            hovertemplate=f"{entry['color']}<extra></extra>",
+        )
+    return go.Scatter(
+        x=[entry["min"], entry["max"]],
+        y=[1, 1],
+        mode="lines",
+        line=dict(color=entry["color"], width=STRIP_WIDTH),
+        showlegend=False,
+    )
 
+def interval_ticks(normalized_data, new_mincolormap, new_maxcolormap):
+    """Return tick values and labels, two per interval, in interval order."""
+    tickvals = []
     for entry in normalized_data:
-        fig.add_trace(
-            go.Scatter(
-                x=[entry["min"], entry["max"]],
-                y=[1, 1],
-                mode="lines",
-                line=dict(color=entry["color"], width=20),
-                showlegend=False,
-            )
-        )
+        tickvals.extend((entry["min"], entry["max"]))
+    ticktext = [f"{new_mincolormap + t * (new_maxcolormap - new_mincolormap):.2f}" for t in tickvals]
+    return tickvals, ticktext
+
+def thin_ticks(tickvals, ticktext, max_ticks):
+    """Drop repeated tick values, then keep every nth so at most max_ticks remain."""
+    ticks = []
+    for tick in zip(tickvals, ticktext):
+        if not ticks or tick[0] != ticks[-1][0]:
+            ticks.append(tick)
+    step = -(-len(ticks) // max_ticks) or 1
+    ticks = ticks[::step]
+    return [value for value, _ in ticks], [text for _, text in ticks]
+
+def split_filter_part(filter_part):
+    """Split one DataTable filter clause into (column, operator, value)."""
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find("{") + 1:name_part.rfind("}")]
+                value_part = value_part.strip()
+                quote = value_part[:1]
+                if quote in ("'", '"', "`") and value_part[-1] == quote:
+                    value = value_part[1:-1].replace("\\" + quote, quote)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+                return name, operator_type[0].strip(), value
+    return None, None, None
+
+def query_intervals(colormap_data, filter_query="", sort_by=None):
+    """Return the indices of the intervals matching a DataTable filter, in sort_by order.
+
+    Intervals are sorted by both min and max, so range clauses narrow the
+    indices with bisect; only color and != clauses look at each interval.
+    """
+    starts, ends, codes = colormap_data.starts, colormap_data.ends, colormap_data.codes
+    labels = [color_label(color).lower() for color in colormap_data.palette]
+    k0, k1 = 0, len(colormap_data)
+    allowed_codes, excluded = None, []
+    for filter_part in (filter_query or "").split(" && "):
+        column, operator, value = split_filter_part(filter_part)
+        if column == "color":
+            value = str(value).lower()
+            if operator == "contains":
+                matches = {code for code, color in enumerate(labels) if value in color}
+            elif operator == "eq":
+                matches = {code for code, color in enumerate(labels) if color == value}
+            elif operator == "ne":
+                matches = {code for code, color in enumerate(labels) if color != value}
+            else:
+                continue
+            allowed_codes = matches if allowed_codes is None else allowed_codes & matches
+        elif column in ("min", "max") and isinstance(value, float):
+            values = starts if column == "min" else ends
+            if operator in ("ge", "eq"):
+                k0 = max(k0, bisect_left(values, value))
+            if operator == "gt":
+                k0 = max(k0, bisect_right(values, value))
+            if operator in ("le", "eq"):
+                k1 = min(k1, bisect_right(values, value))
+            if operator == "lt":
+                k1 = min(k1, bisect_left(values, value))
+            if operator == "ne":
+                excluded.append((values, value))
+
+    indices = range(k0, max(k0, k1))
+    if allowed_codes is not None or excluded:
+        indices = [
+            k for k in indices
+            if (allowed_codes is None or codes[k] in allowed_codes) and all(v[k] != x for v, x in excluded)
+        ]
+    for sort in reversed(sort_by or []):
+        descending = sort["direction"] == "desc"
+        if sort["column_id"] == "color":
+            indices = sorted(indices, key=lambda k: labels[codes[k]], reverse=descending)
+        elif descending:
+            # Already in ascending min and max order
+            indices = indices[::-1]
+    return indices
+
+def interval_rows(colormap_data, indices):
+    """Return color-info table rows for the intervals at indices."""
+    palette = colormap_data.palette
+    return [
+        {"color": color_label(palette[colormap_data.codes[k]]), "min": colormap_data.starts[k], "max": colormap_data.ends[k]}
+        for k in indices
+    ]
+
+def generate_colormap(colormap_data, new_mincolormap, new_maxcolormap, single_trace=None, max_ticks=None):
+    """Generate a Plotly figure for the colormap.
+
+    Above SINGLE_TRACE_THRESHOLD intervals (or when single_trace is True) the strip
+    is one heatmap trace instead of one line trace per interval. With max_ticks,
+    the axis gets at most that many tick labels.
+    """
+    normalized_data = normalize_colormap(colormap_data, new_mincolormap, new_maxcolormap)
+    if single_trace is None:
+        single_trace = len(normalized_data) > SINGLE_TRACE_THRESHOLD
+    fig = go.Figure()
+    # Keep heatmap rows (y 0.5 to 1.5) STRIP_WIDTH pixels tall and centered, like the line traces
+    plot_height = 250 - 20 - 50  # figure height minus top and bottom margins
+    half_range = plot_height / STRIP_WIDTH / 2
+    yaxis = dict(visible=False, fixedrange=True, range=[1 - half_range, 1 + half_range])
+
+    if single_trace:
+        fig.add_trace(generate_strip_heatmap(colormap_data, new_mincolormap, new_maxcolormap))
+        overlay = gradient_overlay(colormap_data, new_mincolormap, new_maxcolormap)
+        if overlay is not None:
+            fig.add_trace(overlay)
+    else:
+        for entry in normalized_data:
+            fig.add_trace(strip_trace(entry))
 
     # Ensure all tick values and text are present
-    tickvals = [entry["min"] for entry in normalized_data] + [entry["max"] for entry in normalized_data]
-    ticktext = [f"{new_mincolormap + t * (new_maxcolormap - new_mincolormap):.2f}" for t in tickvals]
+    tickvals, ticktext = interval_ticks(normalized_data, new_mincolormap, new_maxcolormap)
+    if max_ticks is not None:
+        tickvals, ticktext = thin_ticks(tickvals, ticktext, max_ticks)
 
     fig.update_layout(
         xaxis=dict(
@@ -120,20 +291,140 @@ def generate_colormap(new_mincolormap, new_maxcolormap):
             zeroline=False,
             tickangle=0,
         ),
-        yaxis=dict(visible=False),
+        yaxis=yaxis,
         height=250,
         margin=dict(l=20, r=20, t=20, b=50),
     )
     return fig
 
-def register_callbacks(app):
+def generate_view(colormap_data, new_mincolormap, new_maxcolormap, viewport=None, pixels=STRIP_PIXELS):
+    """Draw the part of the colormap inside viewport at a resolution of pixels.
+
+    Only intervals in the visible range are sent, and those narrower than a
+    pixel are merged, so the figure size depends on pixels, not on the colormap.
+    """
+    lo, hi = new_mincolormap, new_maxcolormap
+    if viewport is not None and max(lo, viewport[0]) < min(hi, viewport[1]):
+        lo, hi = max(lo, viewport[0]), min(hi, viewport[1])
+    visible = colormap_data.downsample(lo, hi, (hi - lo) / pixels)
+    fig = generate_colormap(visible, new_mincolormap, new_maxcolormap, max_ticks=MAX_TICKS)
+    total_range = new_maxcolormap - new_mincolormap
+    fig.update_xaxes(range=[(lo - new_mincolormap) / total_range, (hi - new_mincolormap) / total_range])
+    return fig
+
+def relayout_viewport(relayout_data, new_mincolormap, new_maxcolormap):
+    """Return the x range a relayoutData event zoomed to in colormap units.
+
+    Returns None when the axis was reset to its full range, and False when the
+    event did not touch the x axis.
+    """
+    relayout_data = relayout_data or {}
+    if relayout_data.get("xaxis.autorange"):
+        return None
+    if "xaxis.range[0]" in relayout_data and "xaxis.range[1]" in relayout_data:
+        x0, x1 = relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]
+    elif "xaxis.range" in relayout_data:
+        x0, x1 = relayout_data["xaxis.range"]
+    else:
+        return False
+    total_range = new_maxcolormap - new_mincolormap
+    return (new_mincolormap + x0 * total_range, new_mincolormap + x1 * total_range)
+
+def splice_patch(patch_list, start, stop, items):
+    """Replace patch_list[start:stop] with items as Patch operations."""
+    for _ in range(stop - start):
+        del patch_list[start]
+    for offset, item in enumerate(items):
+        patch_list.insert(start + offset, item)
+
+def patch_intervals(colormap_data, new_mincolormap, new_maxcolormap, i, j, count, single_trace):
+    """Patch the figure after intervals [i, j) were replaced by count new ones."""
+    figure = Patch()
+    normalized_data = normalize_colormap(colormap_data.slice(i, i + count), new_mincolormap, new_maxcolormap)
+
+    if single_trace:
+        edges, z, colors = heatmap_cells(colormap_data, new_mincolormap, new_maxcolormap, i, i + count)
+        trace = figure["data"][0]
+        splice_patch(trace["x"], 2 * i + 1, 2 * j + 1, edges)
+        if i == 0:
+            trace["x"][0] = edges[0]
+        splice_patch(trace["z"][0], 2 * i, 2 * j, z)
+        splice_patch(trace["customdata"][0], 2 * i, 2 * j, colors)
+        trace["colorscale"] = strip_colorscale(colormap_data.palette)
+        trace["zmax"] = len(colormap_data.palette) - 0.5
+    else:
+        splice_patch(figure["data"], i, j, [strip_trace(entry) for entry in normalized_data])
+
+    tickvals, ticktext = interval_ticks(normalized_data, new_mincolormap, new_maxcolormap)
+    splice_patch(figure["layout"]["xaxis"]["tickvals"], 2 * i, 2 * j, tickvals)
+    splice_patch(figure["layout"]["xaxis"]["ticktext"], 2 * i, 2 * j, ticktext)
+    return figure
+
+def patch_colors(colormap_data, recolored, single_trace):
+    """Patch the figure after the intervals in recolored changed color."""
+    figure = Patch()
+    palette = colormap_data.palette
+    if single_trace:
+        trace = figure["data"][0]
+        trace["colorscale"] = strip_colorscale(palette)
+        trace["zmax"] = len(palette) - 0.5
+    for k in recolored:
+        color = palette[colormap_data.codes[k]]
+        if single_trace:
+            trace["z"][0][2 * k + 1] = colormap_data.codes[k]
+            trace["customdata"][0][2 * k + 1] = color
+        else:
+            figure["data"][k]["line"]["color"] = color
+    return figure
+
+def colormap_options(library):
+    """Return dropdown options showing each saved colormap's thumbnail next to its name."""
+    return [
+        {
+            "label": html.Div(
+                [
+                    html.Img(
+                        src=thumbnail_url(entry["name"], entry["created"]),
+                        width=THUMBNAIL_WIDTH,
+                        height=THUMBNAIL_HEIGHT,
+                        style={"marginRight": "8px", "verticalAlign": "middle"},
+                    ),
+                    html.Span(entry["name"]),
+                ],
+            ),
+            "value": entry["name"],
+            "search": entry["name"],
+        }
+        for entry in library.list()
+    ]
+
+def register_callbacks(app, store=None, library=None, metrics=METRICS, writer=None):
+    """Register the app callbacks, keeping each browser session's state in store.
+
+    Saved colormaps go to library, which every session shares, through writer
+    on a background thread. Callback stages are timed into metrics.
+    """
+    if store is None:
+        store = MemoryStore()
+    if library is None:
+        library = ColormapLibrary()
+    if writer is None:
+        writer = LibraryWriter(library)
+
     @app.callback(
         [
             Output("colormap-visual", "figure"),
-            Output("color-info", "children"),
+            Output("colormap-revision", "data"),
             Output("colormap-dropdown", "options"),
             Output("save-status", "children"),
             Output("background-color-dropdown", "options"),
+            Output("background-color-dropdown", "value"),
+            Output("mincolormap", "value"),
+            Output("maxcolormap", "value"),
+            Output("undo-btn", "disabled"),
+            Output("redo-btn", "disabled"),
+            Output("pending-save", "data"),
+            Output("save-poll", "disabled"),
         ],
         [
             Input("add-color-btn", "n_clicks"),
@@ -142,21 +433,36 @@ def register_callbacks(app):
             Input("colormap-dropdown", "value"),
             Input("background-color-dropdown", "value"),
             Input("apply-bounds-btn", "n_clicks"),
+            Input("undo-btn", "n_clicks"),
+            Input("redo-btn", "n_clicks"),
+            Input("colormap-visual", "relayoutData"),
+            Input("intervals-upload", "contents"),
         ],
         [
+            State("intervals-upload", "filename"),
             State("color-dropdown", "value"),
+            State("gradient-end-color", "value"),
+            State("gradient-space", "value"),
             State("min-range", "value"),
             State("max-range", "value"),
             State("mincolormap", "value"),
             State("maxcolormap", "value"),
+            State("session-id", "data"),
         ],
     )
+    @metrics.instrument
     def update_colormap(
         n_clicks_add, n_clicks_save, n_clicks_reset, selected_colormap, new_bg_color, n_clicks_apply_bounds,
-        color, min_range, max_range, new_mincolormap, new_maxcolormap
+        n_clicks_undo, n_clicks_redo, relayout_data, upload_contents, upload_filename, color, end_color, gradient_space,
+        min_range, max_range, new_mincolormap, new_maxcolormap, session_id
     ):
-        global colormap_data, saved_colormaps, background_color, mincolormap, maxcolormap
+        metrics.inc("colormap_callbacks_total", trigger=ctx.triggered_id or "initial")
+        with metrics.timer("load_state"):
+            state = store.load(session_id) if session_id else None
+        if state is None:
+            state = ColormapState()
         save_status = ""
+        pending_save, poll_disabled = no_update, no_update
 
         # Provide default values for new_mincolormap and new_maxcolormap if they are None
         if new_mincolormap is None:
@@ -164,53 +470,227 @@ def register_callbacks(app):
         if new_maxcolormap is None:
             new_maxcolormap = 100
 
-        # Apply colormap bounds
-        if ctx.triggered_id == "apply-bounds-btn":
-            mincolormap, maxcolormap = new_mincolormap, new_maxcolormap
-            trim_and_expand_colormap(mincolormap, maxcolormap)
-
-        # Update background color if changed
-        if new_bg_color and new_bg_color != background_color:
-            replace_background_color(new_bg_color)
-
-        # Add a new color interval
-        if ctx.triggered_id == "add-color-btn" and color and min_range is not None and max_range is not None:
-            update_intervals(color, min_range, max_range)
-
-        # Save the current colormap
-        if ctx.triggered_id == "save-colormap-btn":
-            colormap_name = f"colormap_{len(saved_colormaps) + 1:02d}"
-            saved_colormaps[colormap_name] = {
-                "data": list(colormap_data),
-                "mincolormap": mincolormap,
-                "maxcolormap": maxcolormap,
-            }
-            save_status = f"{colormap_name} saved"
-            with open(f"{colormap_name}.json", "w") as file:
-                json.dump(saved_colormaps[colormap_name], file, indent=4)
-
-        # Reset to default colormap
-        if ctx.triggered_id == "reset-colormap-btn":
-            colormap_data = [{"color": "white", "min": 0, "max": 100}]
-            mincolormap, maxcolormap = 0, 100
-            background_color = "white"
-            save_status = "Colormap reset to default"
-
-        # Load a selected colormap
-        if ctx.triggered_id == "colormap-dropdown" and selected_colormap:
-            selected_data = saved_colormaps[selected_colormap]
-            colormap_data = selected_data["data"]
-            mincolormap = selected_data["mincolormap"]
-            maxcolormap = selected_data["maxcolormap"]
-
-        # Generate the visualization
-        colormap_figure = generate_colormap(mincolormap, maxcolormap)
-        colormap_info = [
-            f"Color: {entry['color']}, Range: [{entry['min']}, {entry['max']}]"
-            for entry in colormap_data
-        ]
+        # Edits made by this trigger; None marks one that needs a full redraw
+        edits = []
+        single_trace_before = len(state.colormap_data) > SINGLE_TRACE_THRESHOLD
+        # Whether the strip on screen has a gradient overlay trace
+        overlay_before = single_trace_before and state.colormap_data.has_gradients()
+        lod_before = state.viewport is not None or len(state.colormap_data) > LOD_THRESHOLD
+        zoomed = False
+        bounds_rejected = False
+
+        with metrics.timer("edit"):
+            # Apply colormap bounds
+            if ctx.triggered_id == "apply-bounds-btn" and not new_mincolormap < new_maxcolormap:
+                save_status = f"Bounds min {new_mincolormap} must be less than max {new_maxcolormap}"
+                bounds_rejected = True
+            elif ctx.triggered_id == "apply-bounds-btn":
+                state.history.record(state)
+                state.mincolormap, state.maxcolormap = new_mincolormap, new_maxcolormap
+                trim_and_expand_colormap(state, state.mincolormap, state.maxcolormap)
+                edits.append(None)
+
+            # Update background color if changed
+            if (
+                ctx.triggered_id == "background-color-dropdown" and new_bg_color
+                and new_bg_color != state.background_color
+            ):
+                state.history.record(state)
+                recolored = replace_background_color(state, new_bg_color)
+                if recolored:
+                    edits.append(("recolor", recolored))
+
+            # Add a new color interval
+            if (
+                ctx.triggered_id == "add-color-btn" and color and min_range is not None and max_range is not None
+                and min_range <= max_range
+            ):
+                if end_color:
+                    # The ramp spans the new range, and keeps its colors if later split or trimmed
+                    color = Gradient(color, end_color, min_range, max_range, gradient_space or "rgb")
+                state.history.record(state)
+                edits.append(("splice",) + update_intervals(state, color, min_range, max_range))
+
+            # Add every range of an uploaded CSV or JSON file in one pass
+            if ctx.triggered_id == "intervals-upload" and upload_contents:
+                try:
+                    text = base64.b64decode(upload_contents.split(",", 1)[1]).decode("utf-8")
+                    ranges = parse_interval_ranges(text)
+                except (IndexError, UnicodeDecodeError, ValueError) as error:
+                    save_status = f"Could not read {upload_filename}: {error}"
+                else:
+                    if ranges:
+                        state.history.record(state)
+                        edits.append(("splice",) + add_intervals(state, ranges))
+                    save_status = f"Added {len(ranges)} ranges from {upload_filename}"
+
+            # Save the current colormap; the write finishes in the background
+            if ctx.triggered_id == "save-colormap-btn":
+                version = (state.colormap_data.snapshot(), state.mincolormap, state.maxcolormap)
+                digest = colormap_hash(state.to_colormap())
+                if state.last_save is not None and state.last_save[0] == digest and state.last_save[1] in library:
+                    save_status = f"{state.last_save[1]} already saved"
+                else:
+                    colormap_name = writer.save(*version)
+                    state.last_save = (digest, colormap_name)
+                    save_status = f"Saving {colormap_name}..."
+                    pending_save, poll_disabled = colormap_name, False
+
+            # Reset to default colormap
+            if ctx.triggered_id == "reset-colormap-btn":
+                state.history.record(state)
+                state = ColormapState(history=state.history, last_save=state.last_save)
+                save_status = "Colormap reset to default"
+                edits.append(None)
+
+            # Load a selected colormap
+            if ctx.triggered_id == "colormap-dropdown" and selected_colormap:
+                try:
+                    snapshot, state_min, state_max = library.load_snapshot(selected_colormap)
+                except KeyError:
+                    save_status = f"{selected_colormap} not found"
+                else:
+                    state.history.record(state)
+                    state.colormap_data = IntervalColormap.from_snapshot(snapshot)
+                    state.mincolormap, state.maxcolormap = state_min, state_max
+                    edits.append(None)
+
+            # Step through the edit history
+            if ctx.triggered_id == "undo-btn" and state.history.undo(state):
+                edits.append(None)
+            if ctx.triggered_id == "redo-btn" and state.history.redo(state):
+                edits.append(None)
+
+            # Zoom or pan the strip
+            if ctx.triggered_id == "colormap-visual":
+                viewport = relayout_viewport(relayout_data, state.mincolormap, state.maxcolormap)
+                if viewport is not False:
+                    state.viewport = viewport
+                    zoomed = True
+
+        if session_id:
+            with metrics.timer("save_state"):
+                store.save(session_id, state)
+        metrics.observe("colormap_intervals", len(state.colormap_data))
+
+        # Send only what changed when a single add or recolor edit allows it. Zoomed
+        # and very large colormaps are drawn at screen resolution instead, so their
+        # figure is redrawn rather than patched.
+        single_trace = len(state.colormap_data) > SINGLE_TRACE_THRESHOLD
+        lod = state.viewport is not None or len(state.colormap_data) > LOD_THRESHOLD
+        with metrics.timer("figure"):
+            # The single-trace strip draws gradients in a second trace that patches do not
+            # update, so redraw when there was one before the edit or is one after it
+            if (
+                ctx.triggered_id is None or None in edits or len(edits) > 1 or single_trace != single_trace_before
+                or (single_trace and edits and (overlay_before or state.colormap_data.has_gradients()))
+            ):
+                colormap_figure = None
+            elif not edits:
+                colormap_figure = no_update
+            elif edits[0][0] == "splice":
+                colormap_figure = patch_intervals(
+                    state.colormap_data, state.mincolormap, state.maxcolormap, *edits[0][1:], single_trace
+                )
+            else:
+                colormap_figure = patch_colors(state.colormap_data, edits[0][1], single_trace)
+            if lod and (colormap_figure is not no_update or zoomed):
+                colormap_figure = generate_view(
+                    state.colormap_data, state.mincolormap, state.maxcolormap, state.viewport
+                )
+            elif colormap_figure is None or (lod_before and colormap_figure is not no_update) or zoomed:
+                colormap_figure = generate_colormap(
+                    state.colormap_data, state.mincolormap, state.maxcolormap, single_trace
+                )
+
+        # A new revision makes the color-info table fetch its current page again
+        revision = uuid.uuid4().hex if ctx.triggered_id is None or edits else no_update
+
+        dropdown_options = no_update
+        if ctx.triggered_id in (None, "save-colormap-btn"):
+            dropdown_options = colormap_options(library)
+        bg_color_options = no_update
+        if ctx.triggered_id in (None, "background-color-dropdown"):
+            bg_color_options = [
+                {"label": c.title(), "value": c}
+                for c in {"white", "black", "gray", "lightblue", "lightgreen", new_bg_color}
+            ]
+
+        # Show the restored background and bounds in their inputs
+        bg_color, mincolormap, maxcolormap = no_update, no_update, no_update
+        if bounds_rejected or ctx.triggered_id in (None, "reset-colormap-btn", "colormap-dropdown", "undo-btn", "redo-btn"):
+            bg_color, mincolormap, maxcolormap = state.background_color, state.mincolormap, state.maxcolormap
+
+        return (
+            colormap_figure, revision, dropdown_options, save_status, bg_color_options,
+            bg_color, mincolormap, maxcolormap, not state.history.can_undo(), not state.history.can_redo(),
+            pending_save, poll_disabled,
+        )
+
+    @app.callback(
+        Output("save-status", "children", allow_duplicate=True),
+        Output("save-poll", "disabled", allow_duplicate=True),
+        Output("colormap-dropdown", "options", allow_duplicate=True),
+        Input("save-poll", "n_intervals"),
+        State("pending-save", "data"),
+        prevent_initial_call=True,
+    )
+    def poll_save_status(n_intervals, colormap_name):
+        if not colormap_name:
+            return no_update, True, no_update
+        status = writer.status(colormap_name)
+        if status == "pending":
+            return no_update, no_update, no_update
+        # Saving changed the colormap's thumbnail URL, or a failed save removed it
+        return f"{colormap_name} {status}", True, colormap_options(library)
 
-        dropdown_options = [{"label": name, "value": name} for name in saved_colormaps.keys()]
-        bg_color_options = [{"label": c.title(), "value": c} for c in {"white", "black", "gray", "lightblue", "lightgreen", new_bg_color}]
+    @app.callback(
+        Output("color-info", "data"),
+        Output("color-info", "page_count"),
+        Input("colormap-revision", "data"),
+        Input("color-info", "page_current"),
+        Input("color-info", "page_size"),
+        Input("color-info", "sort_by"),
+        Input("color-info", "filter_query"),
+        State("session-id", "data"),
+    )
+    @metrics.instrument
+    def update_color_info(revision, page_current, page_size, sort_by, filter_query, session_id):
+        with metrics.timer("load_state"):
+            state = store.load(session_id) if session_id else None
+        if state is None:
+            state = ColormapState()
+        with metrics.timer("info"):
+            page_size = page_size or INFO_PAGE_SIZE
+            indices = query_intervals(state.colormap_data, filter_query, sort_by)
+            page_count = max(1, -(-len(indices) // page_size))
+            page = min(page_current or 0, page_count - 1)
+            rows = interval_rows(state.colormap_data, indices[page * page_size:(page + 1) * page_size])
+        return rows, page_count
 
-        return colormap_figure, [html.Div(info) for info in colormap_info], dropdown_options, save_status, bg_color_options
+    @app.callback(
+        Output("preview-data", "data"),
+        Input("colormap-revision", "data"),
+        State("session-id", "data"),
+    )
+    @metrics.instrument
+    def update_preview_data(revision, session_id):
+        with metrics.timer("load_state"):
+            state = store.load(session_id) if session_id else None
+        if state is None:
+            state = ColormapState()
+        return preview_data(state, PREVIEW_MAX_INTERVALS)
+
+    # Editing the inputs redraws the preview in the browser; only the buttons reach the server
+    app.clientside_callback(
+        ClientsideFunction(namespace="colormap", function_name="preview"),
+        Output("colormap-preview", "figure"),
+        Input("color-dropdown", "value"),
+        Input("gradient-end-color", "value"),
+        Input("gradient-space", "value"),
+        Input("min-range", "value"),
+        Input("max-range", "value"),
+        Input("mincolormap", "value"),
+        Input("maxcolormap", "value"),
+        Input("preview-data", "data"),
+    )
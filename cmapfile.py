@@ -0,0 +1,189 @@
+"""Compact binary colormap files (.cmap) that open without parsing.
+
+A .cmap file holds a small JSON header (bounds, palette, array offsets)
+followed by four 8-byte aligned arrays, one slot per interval: float64
+starts, float64 ends, uint8 (or uint16) palette codes and uint8 flags
+marking which mins and maxes were ints. Gradients are palette entries too,
+written as objects. Reading maps the arrays with np.memmap, so opening
+costs the same for any size. Converting back gives the same JSON.
+
+Convert between the formats by file extension:
+
+    python cmapfile.py colormap_01.json colormap_01.cmap
+    python cmapfile.py colormap_01.cmap colormap_01.json
+"""
+import json
+import struct
+import sys
+
+import numpy as np
+from files import write_atomic
+from gradients import entry_color, interval_dict, palette_from_json, palette_to_json
+from intervals import IntervalColormap
+from lookup import TRANSPARENT, CompiledColormap
+
+MAGIC = b"CMAPBIN1"
+ALIGNMENT = 8
+# Bits of the flags array: the interval's min or max was an int in the JSON
+INT_MIN = 1
+INT_MAX = 2
+
+
+class BinaryColormap:
+    """A colormap read from a .cmap file; starts, ends and codes are NumPy arrays."""
+
+    def __init__(self, starts, ends, codes, palette, mincolormap, maxcolormap, flags=None):
+        self.starts = starts
+        self.ends = ends
+        self.codes = codes
+        self.palette = palette
+        self.mincolormap = mincolormap
+        self.maxcolormap = maxcolormap
+        # INT_MIN and INT_MAX bits per interval; None when every value is a float
+        self.flags = flags
+
+    def __len__(self):
+        return len(self.codes)
+
+    def to_colormap(self):
+        """Return the colormap in the saved {"data", "mincolormap", "maxcolormap"} format."""
+        starts, ends = _restore_ints(self.starts, self.flags, INT_MIN), _restore_ints(self.ends, self.flags, INT_MAX)
+        palette = self.palette
+        data = [interval_dict(palette[code], start, end) for start, end, code in zip(starts, ends, self.codes.tolist())]
+        return {"data": data, "mincolormap": self.mincolormap, "maxcolormap": self.maxcolormap}
+
+    def to_interval_colormap(self):
+        """Return an editable IntervalColormap, sorting the intervals if needed."""
+        starts, ends, codes, flags = self.starts, self.ends, self.codes, self.flags
+        if len(starts) > 1 and np.any(starts[1:] < starts[:-1]):
+            order = np.argsort(starts, kind="stable")
+            starts, ends, codes = starts[order], ends[order], codes[order]
+            flags = None if flags is None else flags[order]
+        starts, ends = _restore_ints(starts, flags, INT_MIN), _restore_ints(ends, flags, INT_MAX)
+        return IntervalColormap(starts, ends, codes.tolist(), self.palette)
+
+    def compile(self, under=None, over=None, bad=TRANSPARENT):
+        """Return the CompiledColormap, built straight from the arrays."""
+        return CompiledColormap.from_arrays(
+            self.starts, self.ends, self.codes, self.palette, self.mincolormap, self.maxcolormap, under, over, bad
+        )
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _restore_ints(values, flags, bit):
+    """Return values as a list, with the ones flagged by bit turned back into ints."""
+    values = values.tolist()
+    if flags is None:
+        return values
+    is_int = (flags & bit).astype(bool)
+    if is_int.all():
+        return [int(x) for x in values]
+    for k in np.flatnonzero(is_int).tolist():
+        values[k] = int(values[k])
+    return values
+
+
+def write_cmap(colormap, path):
+    """Write a {"data", "mincolormap", "maxcolormap"} colormap to path as a .cmap file."""
+    data = colormap["data"]
+    palette, palette_index = [], {}
+    colors = [entry_color(entry) for entry in data]
+    for color in colors:
+        if color not in palette_index:
+            palette_index[color] = len(palette)
+            palette.append(color)
+    code_dtype = "<u1" if len(palette) <= 1 << 8 else "<u2" if len(palette) <= 1 << 16 else "<u4"
+    starts = np.array([entry["min"] for entry in data], dtype="<f8")
+    ends = np.array([entry["max"] for entry in data], dtype="<f8")
+    codes = np.array([palette_index[color] for color in colors], dtype=code_dtype)
+    flags = np.array(
+        [INT_MIN * _is_int(entry["min"]) | INT_MAX * _is_int(entry["max"]) for entry in data], dtype="u1"
+    )
+
+    header = {
+        "mincolormap": colormap["mincolormap"],
+        "maxcolormap": colormap["maxcolormap"],
+        "n_intervals": len(data),
+        "palette": palette_to_json(palette),
+        "code_dtype": code_dtype,
+    }
+    # The header is padded so the arrays that follow are aligned; the offsets
+    # are part of the header, so grow it until they fit
+    offset = 0
+    while True:
+        header["starts_offset"] = offset
+        header["ends_offset"] = offset + starts.nbytes
+        header["codes_offset"] = offset + starts.nbytes + ends.nbytes
+        header["flags_offset"] = header["codes_offset"] + codes.nbytes
+        header_bytes = json.dumps(header).encode()
+        needed = len(MAGIC) + 4 + len(header_bytes)
+        needed += -needed % ALIGNMENT
+        if needed <= offset:
+            break
+        offset = needed
+    padding = offset - len(MAGIC) - 4 - len(header_bytes)
+
+    write_atomic(path, [
+        MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes + b" " * padding,
+        starts.tobytes(),
+        ends.tobytes(),
+        codes.tobytes(),
+        flags.tobytes(),
+    ])
+
+
+def read_cmap(path, mmap=True):
+    """Open a .cmap file, memory-mapping its arrays unless mmap is False."""
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a .cmap file")
+        (header_length,) = struct.unpack("<I", file.read(4))
+        header = json.loads(file.read(header_length))
+
+    n = header["n_intervals"]
+
+    def array(dtype, offset):
+        if n == 0:
+            return np.empty(0, dtype=dtype)
+        if mmap:
+            return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(n,))
+        return np.fromfile(path, dtype=dtype, count=n, offset=offset)
+
+    return BinaryColormap(
+        array("<f8", header["starts_offset"]),
+        array("<f8", header["ends_offset"]),
+        array(header["code_dtype"], header["codes_offset"]),
+        palette_from_json(header["palette"]),
+        header["mincolormap"],
+        header["maxcolormap"],
+        array("u1", header["flags_offset"]),
+    )
+
+
+def load_colormap(path):
+    """Load a saved colormap from a .cmap or JSON file in the JSON format."""
+    if path.endswith(".cmap"):
+        return read_cmap(path).to_colormap()
+    with open(path) as file:
+        return json.load(file)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print(__doc__, file=sys.stderr)
+        return 2
+    source, destination = argv
+    colormap = load_colormap(source)
+    if destination.endswith(".cmap"):
+        write_cmap(colormap, destination)
+    else:
+        write_atomic(destination, json.dumps(colormap, indent=4).encode())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Color large arrays on disk with a saved colormap, one chunk at a time.
+
+The input is a .npy file or a raw binary file (give --dtype and --shape), opened
+as a memory map. The output is written through a memory map as well, as a .npy
+file of uint8 RGB (or RGBA with --alpha) with one extra trailing axis:
+
+    python colorize.py colormap_01.json volume.npy volume_rgb.npy --jobs 8
+    python colorize.py colormap_01.json volume.raw volume_rgb.npy --dtype float32 --shape 512 512 512
+    python colorize.py colormap_01 surface.npy surface_rgb.npy --library colormaps.db
+
+Memory use is bounded by --chunk-size values per worker, whatever the size of
+the input.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from cmapfile import load_colormap, read_cmap
+from lookup import CompiledColormap
+
+# Values colored per task; each worker holds about 9 bytes of index and 4 of color per value
+DEFAULT_CHUNK_SIZE = 1 << 22
+
+
+def open_input(path, dtype=None, shape=None, offset=0):
+    """Memory-map a .npy file, or a raw file of the given dtype and shape, read-only."""
+    if dtype is None:
+        array = np.load(path, mmap_mode="r")
+    else:
+        array = np.memmap(path, dtype=dtype, mode="r", shape=tuple(shape) if shape else None, offset=offset)
+    if not array.flags.c_contiguous:
+        raise ValueError(f"{path} is not stored in C order")
+    return array
+
+
+# The CompiledColormap of a worker process, set once by _init_worker
+_worker_colormap = None
+
+
+def _init_worker(compiled):
+    global _worker_colormap
+    _worker_colormap = compiled
+
+
+def _colorize_chunk(args):
+    compiled, source, destination, start, stop, alpha = args
+    if compiled is None:
+        compiled = _worker_colormap
+    values = open_input(*source).reshape(-1)
+    out = np.load(destination, mmap_mode="r+")
+    out = out.reshape(-1, out.shape[-1])
+    compiled(values[start:stop], alpha=alpha, out=out[start:stop])
+    out.flush()
+
+
+def colorize(colormap, path, destination, dtype=None, shape=None, offset=0, alpha=False,
+             chunk_size=DEFAULT_CHUNK_SIZE, jobs=1, processes=False):
+    """Color the array stored at path into a new uint8 .npy file at destination.
+
+    colormap is a saved colormap or a CompiledColormap; it is compiled once
+    and shared by every chunk. Chunks of chunk_size values are colored by jobs
+    threads, or processes when processes is True; both read and write through
+    memory maps. Returns the shape of the output.
+    """
+    compiled = colormap if isinstance(colormap, CompiledColormap) else CompiledColormap(colormap)
+    source = (path, dtype, shape, offset)
+    values = open_input(*source)
+    out_shape = values.shape + (4 if alpha else 3,)
+    np.lib.format.open_memmap(destination, mode="w+", dtype=np.uint8, shape=out_shape).flush()
+
+    tasks = [
+        (compiled, source, destination, start, min(start + chunk_size, values.size), alpha)
+        for start in range(0, values.size, chunk_size)
+    ]
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            _colorize_chunk(task)
+    elif processes:
+        # Send the compiled colormap to each worker once rather than with every task
+        tasks = [(None,) + task[1:] for task in tasks]
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(compiled,)) as executor:
+            for _ in executor.map(_colorize_chunk, tasks):
+                pass
+    else:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            # NumPy releases the GIL while searching and copying, so threads scale too
+            for _ in executor.map(_colorize_chunk, tasks):
+                pass
+    return out_shape
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Color a large array with a saved colormap.")
+    parser.add_argument("colormap", help="saved colormap JSON or .cmap file, or a name with --library")
+    parser.add_argument("input", help=".npy file, or raw binary file with --dtype and --shape")
+    parser.add_argument("output", help=".npy file to write the uint8 colors to")
+    parser.add_argument("--library", help="load the colormap by name from this SQLite colormap library")
+    parser.add_argument("--dtype", help="element type of a raw input file, e.g. float32")
+    parser.add_argument("--shape", type=int, nargs="+", help="shape of a raw input file")
+    parser.add_argument("--offset", type=int, default=0, help="bytes to skip at the start of a raw input file")
+    parser.add_argument("--alpha", action="store_true", help="write RGBA instead of RGB")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="values colored per task")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of workers")
+    parser.add_argument("--processes", action="store_true", help="use worker processes instead of threads")
+    args = parser.parse_args(argv)
+
+    if args.library:
+        from library import ColormapLibrary
+        colormap = ColormapLibrary(args.library).load(args.colormap)
+    elif args.colormap.endswith(".cmap"):
+        # Compiled straight from the memory-mapped arrays, without building the JSON form
+        colormap = read_cmap(args.colormap).compile()
+    else:
+        colormap = load_colormap(args.colormap)
+
+    start = time.perf_counter()
+    try:
+        shape = colorize(
+            colormap, args.input, args.output, args.dtype, args.shape, args.offset, args.alpha,
+            args.chunk_size, args.jobs, args.processes,
+        )
+    except (OSError, ValueError, KeyError) as error:
+        print(f"{args.input}: {error}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+    size = int(np.prod(shape[:-1]))
+    print(f"{size} values colored in {elapsed:.2f}s ({size / elapsed / 1e6:.1f} M/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""HTTP endpoint that colors batches of values with a saved colormap.
+
+    POST /colormaps/<name>/colors
+
+With ``Content-Type: application/octet-stream`` the body is packed
+little-endian float32 values (``?dtype=float64`` for doubles). The response
+is a stream of uint8 RGBA bytes, four per value (three with ``?alpha=0``),
+sent in chunks of EVALUATE_CHUNK values. With ``application/json`` the body
+is ``{"values": [...]}`` and the response is ``{"colors": [[r, g, b, a], ...]}``.
+
+    curl --data-binary @values.f32 -H "Content-Type: application/octet-stream" \\
+        http://127.0.0.1:8050/colormaps/colormap_01/colors > colors.rgba
+"""
+import json
+
+import numpy as np
+from export import compile_saved_colormap
+
+# Values colored per response chunk
+EVALUATE_CHUNK = 1 << 18
+# Largest request body accepted, in bytes, whether or not it has a Content-Length
+EVALUATE_MAX_BYTES = 256 * 1024 * 1024
+# Bytes read from the request stream at a time
+READ_CHUNK = 1 << 20
+DTYPES = {"float32": "<f4", "float64": "<f8"}
+
+
+def read_body(stream, limit):
+    """Return the bytes of stream, or None as soon as it holds more than limit bytes."""
+    chunks, size = [], 0
+    while True:
+        chunk = stream.read(min(READ_CHUNK, limit + 1 - size))
+        if not chunk:
+            return b"".join(chunks)
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+
+
+def register_evaluation(app, library):
+    """Serve POST /colormaps/<name>/colors for the colormaps in library."""
+    import flask
+
+    @app.server.route("/colormaps/<name>/colors", methods=["POST"])
+    def colormap_colors(name):
+        request = flask.request
+        try:
+            compiled = compile_saved_colormap(library, name)
+        except KeyError:
+            return flask.jsonify(error=f"unknown colormap {name!r}"), 404
+        except ValueError as error:
+            return flask.jsonify(error=str(error)), 422
+        alpha = request.args.get("alpha", "1") not in ("0", "false")
+
+        too_large = flask.jsonify(error=f"request body is larger than {EVALUATE_MAX_BYTES} bytes"), 413
+        if request.content_length and request.content_length > EVALUATE_MAX_BYTES:
+            return too_large
+        # Chunked bodies have no Content-Length, so the limit is enforced while reading too
+        data = read_body(request.stream, EVALUATE_MAX_BYTES)
+        if data is None:
+            return too_large
+
+        if request.mimetype == "application/json":
+            try:
+                body = json.loads(data)
+            except ValueError:
+                body = None
+            if not isinstance(body, dict) or not isinstance(body.get("values"), list):
+                return flask.jsonify(error='expected {"values": [...]}'), 400
+            try:
+                values = np.asarray(body["values"], dtype=np.float64)
+            except (TypeError, ValueError):
+                return flask.jsonify(error="values must be numbers"), 400
+            return flask.jsonify(colors=compiled(values, alpha=alpha, bytes=True).tolist())
+
+        dtype = DTYPES.get(request.args.get("dtype", "float32"))
+        if dtype is None:
+            return flask.jsonify(error=f"dtype must be one of {', '.join(DTYPES)}"), 400
+        if len(data) % np.dtype(dtype).itemsize:
+            return flask.jsonify(error=f"body length is not a multiple of the {dtype} size"), 400
+        values = np.frombuffer(data, dtype=dtype)
+
+        def generate():
+            for start in range(0, len(values), EVALUATE_CHUNK):
+                yield compiled(values[start:start + EVALUATE_CHUNK], alpha=alpha, bytes=True).tobytes()
+
+        response = flask.Response(generate(), mimetype="application/octet-stream")
+        response.headers["X-Color-Channels"] = "4" if alpha else "3"
+        return response
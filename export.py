@@ -0,0 +1,124 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from gradients import css_color
+from lookup import CompiledColormap, colormap_bounds
+
+# Maximum number of compiled colormaps, lookup tables and colorscales kept in memory
+CACHE_SIZE = 128
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def colormap_hash(colormap):
+    """Return a content hash of the interval data and bounds of a colormap."""
+    data, lo, hi = colormap_bounds(colormap)
+    payload = json.dumps(
+        {"data": data, "mincolormap": lo, "maxcolormap": hi},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _cached(key, build):
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    value = build()
+    with _cache_lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return value
+
+
+def clear_cache():
+    """Drop every cached export."""
+    with _cache_lock:
+        _cache.clear()
+
+
+def compile_colormap(colormap, key=None):
+    """Return the CompiledColormap for a colormap, reusing it across calls."""
+    key = key or colormap_hash(colormap)
+    return _cached((key, "compiled"), lambda: CompiledColormap(colormap))
+
+
+def compile_saved_colormap(library, name):
+    """Return the CompiledColormap of a colormap in a ColormapLibrary.
+
+    It is cached under the colormap's name and version, so the data is only
+    read again after the colormap is saved again.
+    """
+    key = (library.path, name, library.version(name), "saved")
+    return _cached(key, lambda: CompiledColormap(library.load(name)))
+
+
+def lookup_table(colormap, n=256, alpha=True, bytes=False):
+    """Sample the colormap at n evenly spaced bin centers between its bounds.
+
+    The returned (n, 4) or (n, 3) array is shared through the cache and read-only.
+    """
+    key = colormap_hash(colormap)
+
+    def build():
+        compiled = compile_colormap(colormap, key)
+        lo, hi = compiled.mincolormap, compiled.maxcolormap
+        values = lo + (np.arange(n) + 0.5) * ((hi - lo) / n)
+        lut = compiled(values, alpha=alpha, bytes=bytes)
+        lut.setflags(write=False)
+        return lut
+
+    return _cached((key, "lut", n, alpha, bytes), build)
+
+
+def to_matplotlib(colormap):
+    """Return a (ListedColormap, BoundaryNorm) pair drawing exactly the colormap intervals.
+
+    Gradient intervals become GRADIENT_STEPS flat steps. The objects are shared
+    through the cache, so copy them before changing them.
+    """
+    key = colormap_hash(colormap)
+
+    def build():
+        from matplotlib.colors import BoundaryNorm, ListedColormap
+
+        compiled = compile_colormap(colormap, key)
+        rgba = compiled.rgba
+        edges, rows = compiled.steps()
+        cmap = ListedColormap(rows, name=f"colormap_{key[:8]}")
+        cmap.set_under(rgba[0])
+        cmap.set_over(rgba[-2])
+        cmap.set_bad(rgba[-1])
+        norm = BoundaryNorm(edges, ncolors=len(rows))
+        return cmap, norm
+
+    return _cached((key, "matplotlib"), build)
+
+
+def plotly_colorscale(colormap):
+    """Return a stepped Plotly colorscale, normalized to the colormap bounds.
+
+    Gradient intervals become GRADIENT_STEPS flat steps.
+    """
+    key = colormap_hash(colormap)
+
+    def build():
+        edges, rows = compile_colormap(colormap, key).steps()
+        positions = ((edges - edges[0]) / (edges[-1] - edges[0])).tolist()
+        positions[-1] = 1.0
+        colorscale = []
+        for k, rgba in enumerate(rows):
+            color = css_color(rgba)
+            colorscale.append([positions[k], color])
+            colorscale.append([positions[k + 1], color])
+        return colorscale
+
+    return _cached((key, "plotly"), build)
@@ -0,0 +1,20 @@
+import os
+import tempfile
+
+
+def write_atomic(path, data):
+    """Write bytes, or a list of bytes chunks, to path so readers never see a partial file.
+
+    The data goes to a temporary file in the same directory, which then
+    replaces path in one step.
+    """
+    chunks = [data] if isinstance(data, (bytes, bytearray, memoryview)) else data
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
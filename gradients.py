@@ -0,0 +1,137 @@
+import numpy as np
+from colors import to_rgba
+
+# Color spaces a gradient can be interpolated in: gamma-encoded sRGB, or OKLab,
+# where equal steps look like equal changes in color
+SPACES = ("rgb", "oklab")
+
+_RGB_TO_LMS = np.array([
+    [0.4122214708, 0.5363325363, 0.0514459929],
+    [0.2119034982, 0.6806995451, 0.1073969566],
+    [0.0883024619, 0.2817188376, 0.6299787005],
+])
+_LMS_TO_OKLAB = np.array([
+    [0.2104542553, 0.7936177850, -0.0040720468],
+    [1.9779984951, -2.4285922050, 0.4505937099],
+    [0.0259040371, 0.7827717662, -0.8086757660],
+])
+_OKLAB_TO_LMS = np.linalg.inv(_LMS_TO_OKLAB)
+_LMS_TO_RGB = np.linalg.inv(_RGB_TO_LMS)
+
+
+class Gradient:
+    """A color ramp from color at start to end_color at end, interpolated in space.
+
+    Gradients are palette entries like color names. An interval painted with
+    one takes its colors from the part of the ramp it covers, so splitting or
+    trimming the interval leaves the gradient unchanged.
+    """
+
+    __slots__ = ("color", "end_color", "start", "end", "space")
+
+    def __init__(self, color, end_color, start, end, space="rgb"):
+        if space not in SPACES:
+            raise ValueError(f"Unknown gradient space {space!r}, expected one of {', '.join(SPACES)}")
+        if start > end:
+            raise ValueError(f"Gradient start {start} is greater than end {end}")
+        self.color = color
+        self.end_color = end_color
+        self.start = start
+        self.end = end
+        self.space = space
+
+    def _key(self):
+        return (self.color, self.end_color, self.start, self.end, self.space)
+
+    def __eq__(self, other):
+        if not isinstance(other, Gradient):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"Gradient({self.color!r}, {self.end_color!r}, {self.start!r}, {self.end!r}, {self.space!r})"
+
+    def __str__(self):
+        return f"{self.color} → {self.end_color}"
+
+    def rescale(self, lo, hi):
+        """Return the same gradient with its anchors mapped from [lo, hi] to [0, 1]."""
+        total_range = hi - lo
+        return Gradient(
+            self.color, self.end_color, (self.start - lo) / total_range, (self.end - lo) / total_range, self.space
+        )
+
+    def to_json(self):
+        return {"end_color": self.end_color, "start": self.start, "end": self.end, "space": self.space}
+
+    def __call__(self, values):
+        """Return the RGBA colors, floats in [0, 1], at values as an (n, 4) array."""
+        values = np.asarray(values, dtype=np.float64)
+        ends = np.array([to_rgba(self.color), to_rgba(self.end_color)])
+        coords = to_space(ends[:, :3], self.space)
+        t = gradient_position(values, np.full(values.shape, self.start), np.full(values.shape, self.end))
+        rgba = np.empty(values.shape + (4,))
+        rgba[..., :3] = from_space(coords[0] + t[..., None] * (coords[1] - coords[0]), self.space)
+        rgba[..., 3] = ends[0, 3] + t * (ends[1, 3] - ends[0, 3])
+        return rgba
+
+
+def gradient_position(values, starts, ends):
+    """Return where values fall between starts and ends, clipped to [0, 1]."""
+    span = ends - starts
+    t = np.divide(values - starts, span, out=np.zeros(np.broadcast(values, span).shape), where=span > 0)
+    return np.clip(t, 0.0, 1.0, out=t)
+
+
+def to_space(rgb, space):
+    """Convert (n, 3) sRGB floats in [0, 1] to coordinates in space."""
+    rgb = np.asarray(rgb, dtype=np.float64)
+    if space == "rgb":
+        return rgb
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    return np.cbrt(linear @ _RGB_TO_LMS.T) @ _LMS_TO_OKLAB.T
+
+
+def from_space(coords, space):
+    """Convert (n, 3) coordinates in space back to sRGB floats clipped to [0, 1]."""
+    if space == "rgb":
+        return np.clip(coords, 0.0, 1.0)
+    linear = np.clip(((coords @ _OKLAB_TO_LMS.T) ** 3) @ _LMS_TO_RGB.T, 0.0, 1.0)
+    return np.where(linear <= 0.0031308, linear * 12.92, 1.055 * linear ** (1 / 2.4) - 0.055)
+
+
+def css_color(rgba):
+    """Format an RGBA float row as a CSS rgba() string."""
+    r, g, b, a = rgba
+    return f"rgba({round(r * 255)}, {round(g * 255)}, {round(b * 255)}, {a:g})"
+
+
+def entry_color(entry):
+    """Return the palette entry of a {"color", "min", "max"} dict: a color name or a Gradient."""
+    gradient = entry.get("gradient")
+    if gradient is None:
+        return entry["color"]
+    return Gradient(entry["color"], gradient["end_color"], gradient["start"], gradient["end"], gradient.get("space", "rgb"))
+
+
+def interval_dict(color, start, end):
+    """Return the saved JSON form of an interval painted with a color name or a Gradient."""
+    if isinstance(color, Gradient):
+        return {"color": color.color, "min": start, "max": end, "gradient": color.to_json()}
+    return {"color": color, "min": start, "max": end}
+
+
+def color_label(color):
+    """Return the text shown for a palette entry."""
+    return color if isinstance(color, str) else str(color)
+
+
+def palette_to_json(palette):
+    return [dict(color.to_json(), color=color.color) if isinstance(color, Gradient) else color for color in palette]
+
+
+def palette_from_json(items):
+    return [entry_color(dict(gradient=item, color=item["color"])) if isinstance(item, dict) else item for item in items]
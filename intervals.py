@@ -0,0 +1,442 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from itertools import chain
+
+from gradients import Gradient, entry_color, interval_dict
+
+# Intervals per snapshot chunk; a new snapshot only rebuilds the chunks edits touched
+SNAPSHOT_CHUNK = 256
+
+
+class ColormapSnapshot:
+    """Immutable version of an IntervalColormap.
+
+    Intervals are stored in chunks of (starts, ends, codes) tuples, and
+    snapshots of the same colormap share every chunk that did not change
+    between them.
+    """
+
+    __slots__ = ("chunks", "palette", "_length")
+
+    def __init__(self, chunks, palette):
+        self.chunks = tuple(chunks)
+        self.palette = tuple(palette)
+        self._length = sum(len(chunk[0]) for chunk in self.chunks)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        """Yield (color, min, max) tuples in ascending order."""
+        palette = self.palette
+        for starts, ends, codes in self.chunks:
+            for start, end, code in zip(starts, ends, codes):
+                yield palette[code], start, end
+
+    def to_dicts(self):
+        """Return the intervals in the JSON format used by saved colormaps."""
+        return [interval_dict(color, start, end) for color, start, end in self]
+
+
+class IntervalColormap:
+    """Sorted, non-overlapping color intervals stored as parallel arrays.
+
+    ``starts``, ``ends`` and ``codes`` hold one slot per interval, ordered by
+    start. ``codes`` index into ``palette``, so each color name (or Gradient)
+    is stored once.
+    """
+
+    def __init__(self, starts=None, ends=None, codes=None, palette=None):
+        self.starts = list(starts or [])
+        self.ends = list(ends or [])
+        self.codes = list(codes or [])
+        self.palette = list(palette or [])
+        self._palette_index = {color: code for code, color in enumerate(self.palette)}
+        # Last snapshot taken, and how many leading/trailing intervals are unchanged since
+        self._snapshot = None
+        self._prefix = self._suffix = 0
+
+    @classmethod
+    def from_dicts(cls, entries):
+        """Build from the JSON format: a list of {"color", "min", "max"} dicts, with "gradient" for ramps."""
+        colormap = cls()
+        for entry in sorted(entries, key=lambda x: x["min"]):
+            colormap.starts.append(entry["min"])
+            colormap.ends.append(entry["max"])
+            colormap.codes.append(colormap._code(entry_color(entry)))
+        return colormap
+
+    def to_dicts(self):
+        """Return the intervals in the JSON format used by saved colormaps."""
+        palette = self.palette
+        return [interval_dict(palette[code], start, end) for start, end, code in zip(self.starts, self.ends, self.codes)]
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Build an editable colormap from a snapshot; the snapshot stays untouched."""
+        chunks = snapshot.chunks
+        colormap = cls(
+            chain.from_iterable(chunk[0] for chunk in chunks),
+            chain.from_iterable(chunk[1] for chunk in chunks),
+            chain.from_iterable(chunk[2] for chunk in chunks),
+            snapshot.palette,
+        )
+        colormap._snapshot = snapshot
+        colormap._prefix = colormap._suffix = len(colormap)
+        return colormap
+
+    def snapshot(self):
+        """Return an immutable ColormapSnapshot of the current intervals.
+
+        Chunks outside the intervals edited since the previous snapshot are
+        reused, so a snapshot costs time and memory proportional to the edits.
+        """
+        n = len(self)
+        old = self._snapshot
+        if old is not None and self._prefix >= n and n == len(old) and tuple(self.palette) == old.palette:
+            return old
+
+        head, tail = [], []
+        head_count = tail_count = 0
+        if old is not None and self._prefix < n:
+            for chunk in old.chunks:
+                if head_count + len(chunk[0]) > self._prefix:
+                    break
+                head.append(chunk)
+                head_count += len(chunk[0])
+            for chunk in reversed(old.chunks[len(head):]):
+                if tail_count + len(chunk[0]) > self._suffix:
+                    break
+                tail.append(chunk)
+                tail_count += len(chunk[0])
+            tail.reverse()
+            # Fold small chunks at the edges back in so chunks do not fragment over time
+            if head and len(head[-1][0]) < SNAPSHOT_CHUNK // 2:
+                head_count -= len(head.pop()[0])
+            if tail and len(tail[0][0]) < SNAPSHOT_CHUNK // 2:
+                tail_count -= len(tail.pop(0)[0])
+        elif old is not None:
+            # Only the palette changed
+            head, head_count = list(old.chunks), n
+
+        middle = []
+        for k in range(head_count, n - tail_count, SNAPSHOT_CHUNK):
+            stop = min(k + SNAPSHOT_CHUNK, n - tail_count)
+            middle.append((tuple(self.starts[k:stop]), tuple(self.ends[k:stop]), tuple(self.codes[k:stop])))
+
+        self._snapshot = ColormapSnapshot(head + middle + tail, self.palette)
+        self._prefix = self._suffix = n
+        return self._snapshot
+
+    def _touch(self, i, j):
+        """Record that intervals [i, j) are about to change."""
+        self._prefix = min(self._prefix, i)
+        self._suffix = min(self._suffix, len(self) - j)
+
+    def copy(self):
+        return IntervalColormap(self.starts, self.ends, self.codes, self.palette)
+
+    def slice(self, i, j):
+        """Return intervals [i, j) as a new colormap sharing the same palette codes."""
+        return IntervalColormap(self.starts[i:j], self.ends[i:j], self.codes[i:j], self.palette)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        """Yield (color, min, max) tuples in ascending order."""
+        palette = self.palette
+        for start, end, code in zip(self.starts, self.ends, self.codes):
+            yield palette[code], start, end
+
+    def __eq__(self, other):
+        if not isinstance(other, IntervalColormap):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def has_gradients(self):
+        """Return whether any interval is painted with a Gradient.
+
+        Palette entries outlive the intervals that used them, so this looks at the codes in use.
+        """
+        palette = self.palette
+        return any(isinstance(palette[code], Gradient) for code in set(self.codes))
+
+    def _code(self, color):
+        code = self._palette_index.get(color)
+        if code is None:
+            code = len(self.palette)
+            self.palette.append(color)
+            self._palette_index[color] = code
+        return code
+
+    def _overlap_span(self, lo, hi):
+        """Return the slice [i, j) of intervals with max > lo and min < hi."""
+        i = bisect_right(self.ends, lo)
+        j = bisect_left(self.starts, hi)
+        return i, max(i, j)
+
+    def downsample(self, lo, hi, resolution):
+        """Return the intervals inside [lo, hi] with detail finer than resolution merged.
+
+        Intervals at least resolution wide are kept, clipped to [lo, hi]. Runs of
+        narrower ones become resolution-wide cells painted with the color at the
+        cell center, so the result has at most about 2 * (hi - lo) / resolution
+        intervals however many the colormap holds.
+        """
+        starts, ends, codes = self.starts, self.ends, self.codes
+        out = IntervalColormap(palette=self.palette)
+        n = len(starts)
+        x = lo
+        while x < hi:
+            k = bisect_right(ends, x)
+            if k >= n or starts[k] >= hi:
+                break
+            x = max(x, starts[k])
+            end = min(ends[k], hi)
+            code = codes[k]
+            if end - x < resolution and x + resolution > x:
+                end = min(x + resolution, hi)
+                center = (x + end) / 2
+                m = bisect_right(ends, center)
+                if m < n and starts[m] <= center:
+                    code = codes[m]
+            if out.codes and out.codes[-1] == code and out.ends[-1] == x:
+                out.ends[-1] = end
+            else:
+                out.starts.append(x)
+                out.ends.append(end)
+                out.codes.append(code)
+            x = end
+        return out
+
+    def insert(self, color, lo, hi):
+        """Paint [lo, hi] with color, splitting any intervals it overlaps.
+
+        Returns (i, j, count): intervals [i, j) were replaced by count new ones at i.
+        """
+        if lo > hi:
+            raise ValueError(f"Interval min {lo} is greater than max {hi}")
+        starts, ends, codes = self.starts, self.ends, self.codes
+        code = self._code(color)
+        i, j = self._overlap_span(lo, hi)
+
+        new_starts, new_ends, new_codes = [], [], []
+        if i < j and starts[i] < lo:
+            # Keep the part of the first overlapped interval left of lo
+            new_starts.append(starts[i])
+            new_ends.append(lo)
+            new_codes.append(codes[i])
+        new_starts.append(lo)
+        new_ends.append(hi)
+        new_codes.append(code)
+        if i < j and ends[j - 1] > hi:
+            # Keep the part of the last overlapped interval right of hi
+            new_starts.append(hi)
+            new_ends.append(ends[j - 1])
+            new_codes.append(codes[j - 1])
+
+        self._touch(i, j)
+        starts[i:j] = new_starts
+        ends[i:j] = new_ends
+        codes[i:j] = new_codes
+        return i, j, len(new_codes)
+
+    def insert_many(self, entries, merge=False):
+        """Paint a batch of (color, min, max) ranges, later ones winning overlaps.
+
+        Gives the same intervals as calling insert on each entry in order, but
+        resolves the whole batch in one sweep over its sorted boundaries,
+        copying the existing intervals between them as they are, and splices
+        the result in once. With merge, consecutive intervals that share a
+        color are merged afterwards, as merge_runs does.
+
+        Returns (i, j, count) like insert, or None when merge rewrote the list.
+        """
+        entries = list(entries)
+        for color, lo, hi in entries:
+            if lo > hi:
+                raise ValueError(f"Interval min {lo} is greater than max {hi}")
+        if not entries:
+            if merge:
+                self.merge_runs()
+                return None
+            return 0, 0, 0
+        starts, ends, codes = self.starts, self.ends, self.codes
+        batch_codes = [self._code(color) for color, _, _ in entries]
+        lo = min(entry[1] for entry in entries)
+        hi = max(entry[2] for entry in entries)
+        # Existing intervals that touch [lo, hi], including zero-width ones at either end
+        i = bisect_left(ends, lo)
+        j = max(i, bisect_right(starts, hi))
+
+        # Equal bounds such as 1 and 1.0 share a point, spelled as the latest range spells it
+        points, opening, markers = {}, {}, {}
+        for t, (_, start, end) in enumerate(entries):
+            points[start] = start
+            points[end] = end
+            if start < end:
+                opening.setdefault(start, []).append(t)
+            else:
+                markers.setdefault(start, []).append(t)
+        if i < j:
+            points.setdefault(starts[i], starts[i])
+            points.setdefault(ends[j - 1], ends[j - 1])
+        points = sorted(points.values())
+
+        # Existing intervals count as older than the whole batch. A zero-width
+        # range survives unless a later range strictly contains its point.
+        new_starts, new_ends, new_codes = [], [], []
+        active = []  # heap of (-t, max) for the batch ranges covering the sweep point
+        k = i  # first existing interval that does not end before the sweep point
+        owner = None  # what painted the last interval added, while it can still be extended
+        for n, x in enumerate(points):
+            while active and active[0][1] <= x:
+                heapq.heappop(active)
+            # Ranges now in the heap contain x strictly
+            newest = -active[0][0] if active else -1
+            while k < j and ends[k] <= x:
+                if starts[k] == x and not active:
+                    new_starts.append(starts[k])
+                    new_ends.append(ends[k])
+                    new_codes.append(codes[k])
+                    owner = None
+                k += 1
+            for t in markers.get(x, ()):
+                if t > newest:
+                    new_starts.append(entries[t][1])
+                    new_ends.append(entries[t][2])
+                    new_codes.append(batch_codes[t])
+                    owner = None
+            for t in opening.get(x, ()):
+                heapq.heappush(active, (-t, entries[t][2]))
+            if n + 1 == len(points):
+                break
+            y = points[n + 1]
+            stop = bisect_left(starts, y, k, j)
+
+            if active:
+                # The newest batch range paints [x, y) over whatever was there
+                t = -active[0][0]
+                if owner == t and new_ends[-1] == x:
+                    new_ends[-1] = y
+                else:
+                    new_starts.append(x)
+                    new_ends.append(y)
+                    new_codes.append(batch_codes[t])
+                    owner = t
+                k = max(k, stop - 1)
+            elif k < stop:
+                # No batch range here: copy the existing intervals, clipped to [x, y)
+                first = k
+                if starts[k] < x:
+                    if owner == -1 - k and new_ends[-1] == x:
+                        new_ends[-1] = ends[k]
+                    else:
+                        new_starts.append(x)
+                        new_ends.append(ends[k])
+                        new_codes.append(codes[k])
+                    first += 1
+                new_starts.extend(starts[first:stop])
+                new_ends.extend(ends[first:stop])
+                new_codes.extend(codes[first:stop])
+                last = stop - 1
+                if ends[last] > y:
+                    new_ends[-1] = y
+                    k = last
+                else:
+                    k = stop
+                # Existing intervals are owners -1, -2, ... so they never equal a batch index
+                owner = -1 - last if starts[last] < ends[last] else None
+            else:
+                owner = None
+
+        self._touch(i, j)
+        starts[i:j] = new_starts
+        ends[i:j] = new_ends
+        codes[i:j] = new_codes
+        if merge:
+            self.merge_runs()
+            return None
+        return i, j, len(new_codes)
+
+    def replace_color(self, old_color, new_color):
+        """Recolor every interval painted with old_color and return their indices."""
+        old_code = self._palette_index.get(old_color)
+        if old_code is None or old_color == new_color:
+            return []
+        recolored = [k for k, code in enumerate(self.codes) if code == old_code]
+        new_code = self._palette_index.get(new_color)
+        if new_code is None:
+            # Renaming the palette entry recolors every interval at once
+            self.palette[old_code] = new_color
+            del self._palette_index[old_color]
+            self._palette_index[new_color] = old_code
+            return recolored
+        if recolored:
+            self._touch(recolored[0], recolored[-1] + 1)
+        codes = self.codes
+        for k in recolored:
+            codes[k] = new_code
+        return recolored
+
+    def trim_and_expand(self, lo, hi, background):
+        """Clip the intervals to [lo, hi] and pad the ends with background."""
+        starts, ends, codes = self.starts, self.ends, self.codes
+        i, j = self._overlap_span(lo, hi)
+        self._touch(0, len(self))
+        del starts[j:], ends[j:], codes[j:]
+        del starts[:i], ends[:i], codes[:i]
+
+        background_code = self._code(background)
+        if not starts:
+            starts.append(lo)
+            ends.append(hi)
+            codes.append(background_code)
+        else:
+            if starts[0] < lo:
+                starts[0] = lo
+            elif starts[0] > lo:
+                starts.insert(0, lo)
+                ends.insert(0, starts[1])
+                codes.insert(0, background_code)
+            if ends[-1] > hi:
+                ends[-1] = hi
+            elif ends[-1] < hi:
+                starts.append(ends[-1])
+                ends.append(hi)
+                codes.append(background_code)
+
+        self.merge_runs()
+
+    def merge_runs(self):
+        """Merge consecutive intervals that share a color."""
+        starts, ends, codes = self.starts, self.ends, self.codes
+        if len(codes) < 2:
+            return
+        self._touch(0, len(self))
+        keep = 0
+        for k in range(1, len(codes)):
+            if codes[k] == codes[keep]:
+                ends[keep] = ends[k]
+            else:
+                keep += 1
+                starts[keep] = starts[k]
+                ends[keep] = ends[k]
+                codes[keep] = codes[k]
+        del starts[keep + 1:], ends[keep + 1:], codes[keep + 1:]
+
+
+def normalize_colormap(colormap_data, new_mincolormap, new_maxcolormap):
+    """Normalize the colormap to fit within a fixed length, ensuring min and max are constant."""
+    total_range = new_maxcolormap - new_mincolormap
+    normalized_data = []
+
+    for color, entry_min, entry_max in colormap_data:
+        if isinstance(color, Gradient):
+            color = color.rescale(new_mincolormap, new_maxcolormap)
+        normalized_min = (entry_min - new_mincolormap) / total_range
+        normalized_max = (entry_max - new_mincolormap) / total_range
+        normalized_data.append({"color": color, "min": normalized_min, "max": normalized_max})
+
+    return normalized_data
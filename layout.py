@@ -1,6 +1,13 @@
-from dash import html, dcc
+import uuid
+from dash import dash_table, html, dcc
+
+# Rows per page of the color-info table
+INFO_PAGE_SIZE = 50
+# Colors offered for new ranges and gradient ends
+RANGE_COLORS = ["red", "blue", "green", "orange", "purple", "yellow", "cyan", "magenta", "gray", "brown"]
 
 def create_layout():
+    # Called on every page load, so each browser tab gets its own session id
     return html.Div(
         style={
             "fontFamily": "Arial, sans-serif",
@@ -8,6 +15,8 @@ def create_layout():
             "padding": "20px",
         },
         children=[
+            # Per-tab session id; the stored value wins over this one on reload
+            dcc.Store(id="session-id", storage_type="session", data=uuid.uuid4().hex),
             # Header
             html.Div(
                 style={
@@ -159,21 +168,7 @@ def create_layout():
                                             ),
                                             dcc.Dropdown(
                                                 id="color-dropdown",
-                                                options=[
-                                                    {"label": c.title(), "value": c}
-                                                    for c in [
-                                                        "red",
-                                                        "blue",
-                                                        "green",
-                                                        "orange",
-                                                        "purple",
-                                                        "yellow",
-                                                        "cyan",
-                                                        "magenta",
-                                                        "gray",
-                                                        "brown",
-                                                    ]
-                                                ],
+                                                options=[{"label": c.title(), "value": c} for c in RANGE_COLORS],
                                                 placeholder="Select a color",
                                                 style={
                                                     "marginTop": "5px",
@@ -183,6 +178,36 @@ def create_layout():
                                             ),
                                         ],
                                     ),
+                                    html.Div(
+                                        style={"marginTop": "10px"},
+                                        children=[
+                                            html.Label(
+                                                "Gradient To (optional):",
+                                                style={"fontSize": "14px"},
+                                            ),
+                                            dcc.Dropdown(
+                                                id="gradient-end-color",
+                                                options=[{"label": c.title(), "value": c} for c in RANGE_COLORS],
+                                                placeholder="Flat color",
+                                                style={
+                                                    "marginTop": "5px",
+                                                    "padding": "5px",
+                                                    "fontSize": "14px",
+                                                },
+                                            ),
+                                            dcc.RadioItems(
+                                                id="gradient-space",
+                                                options=[
+                                                    {"label": "RGB", "value": "rgb"},
+                                                    {"label": "Perceptual (OKLab)", "value": "oklab"},
+                                                ],
+                                                value="oklab",
+                                                inline=True,
+                                                style={"fontSize": "14px"},
+                                                inputStyle={"marginRight": "4px", "marginLeft": "8px"},
+                                            ),
+                                        ],
+                                    ),
                                     html.Div(
                                         style={"marginTop": "10px"},
                                         children=[
@@ -236,6 +261,69 @@ def create_layout():
                                             "cursor": "pointer",
                                         },
                                     ),
+                                    dcc.Upload(
+                                        id="intervals-upload",
+                                        children=html.Div(
+                                            "Drop or select a CSV/JSON file of color, min, max ranges"
+                                        ),
+                                        multiple=False,
+                                        style={
+                                            "marginTop": "15px",
+                                            "padding": "10px",
+                                            "fontSize": "13px",
+                                            "textAlign": "center",
+                                            "border": "1px dashed #3e4c6d",
+                                            "borderRadius": "4px",
+                                            "cursor": "pointer",
+                                        },
+                                    ),
+                                ],
+                            ),
+                            # Section: Edit History
+                            html.Div(
+                                style={
+                                    "marginBottom": "20px",
+                                    "paddingBottom": "15px",
+                                    "borderBottom": "1px solid #d3d3d3",
+                                },
+                                children=[
+                                    html.Label(
+                                        "Edit History",
+                                        style={"fontWeight": "bold", "fontSize": "16px", "display": "block"},
+                                    ),
+                                    html.Button(
+                                        "Undo",
+                                        id="undo-btn",
+                                        n_clicks=0,
+                                        disabled=True,
+                                        style={
+                                            "marginTop": "10px",
+                                            "padding": "10px 15px",
+                                            "fontSize": "14px",
+                                            "backgroundColor": "#3e4c6d",
+                                            "color": "white",
+                                            "border": "none",
+                                            "borderRadius": "4px",
+                                            "cursor": "pointer",
+                                            "marginRight": "10px",
+                                        },
+                                    ),
+                                    html.Button(
+                                        "Redo",
+                                        id="redo-btn",
+                                        n_clicks=0,
+                                        disabled=True,
+                                        style={
+                                            "marginTop": "10px",
+                                            "padding": "10px 15px",
+                                            "fontSize": "14px",
+                                            "backgroundColor": "#3e4c6d",
+                                            "color": "white",
+                                            "border": "none",
+                                            "borderRadius": "4px",
+                                            "cursor": "pointer",
+                                        },
+                                    ),
                                 ],
                             ),
                             # Section: Save and Load
@@ -270,6 +358,9 @@ def create_layout():
                                                     "color": "green",
                                                 },
                                             ),
+                                            # Polls the background save until it is written
+                                            dcc.Store(id="pending-save"),
+                                            dcc.Interval(id="save-poll", interval=500, disabled=True),
                                         ],
                                     ),
                                     html.Div(
@@ -329,13 +420,32 @@ def create_layout():
                                 },
                             ),
                             dcc.Graph(id="colormap-visual"),
-                            html.Div(
+                            # Drawn in the browser from preview-data as the range and bounds inputs change
+                            dcc.Graph(id="colormap-preview", config={"displayModeBar": False}),
+                            dcc.Store(id="preview-data"),
+                            # Changes whenever the colormap does, so the table reloads its page
+                            dcc.Store(id="colormap-revision"),
+                            dash_table.DataTable(
                                 id="color-info",
-                                style={
-                                    "marginTop": "20px",
+                                columns=[
+                                    {"name": "Color", "id": "color"},
+                                    {"name": "Min", "id": "min", "type": "numeric"},
+                                    {"name": "Max", "id": "max", "type": "numeric"},
+                                ],
+                                page_current=0,
+                                page_size=INFO_PAGE_SIZE,
+                                page_action="custom",
+                                sort_action="custom",
+                                sort_mode="single",
+                                sort_by=[],
+                                filter_action="custom",
+                                filter_query="",
+                                style_table={"marginTop": "20px"},
+                                style_cell={
+                                    "fontFamily": "Arial, sans-serif",
                                     "fontSize": "14px",
-                                    "lineHeight": "1.5",
                                     "color": "#333",
+                                    "textAlign": "left",
                                 },
                             ),
                         ],
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from intervals import IntervalColormap
+
+DEFAULT_LIBRARY_PATH = "colormaps.db"
+
+# Bounds are declared without a type so SQLite keeps ints as ints and floats as floats
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS colormaps (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE,
+    mincolormap,
+    maxcolormap,
+    n_intervals INTEGER NOT NULL,
+    created REAL NOT NULL,
+    content_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS colormap_data (
+    id INTEGER PRIMARY KEY REFERENCES colormaps(id) ON DELETE CASCADE,
+    data TEXT NOT NULL
+);
+"""
+
+# Rows of colormaps whose data is stored, as opposed to names only reserved by LibraryWriter
+WRITTEN = "EXISTS (SELECT 1 FROM colormap_data d WHERE d.id = colormaps.id)"
+
+
+class ColormapLibrary:
+    """Saved colormaps in one SQLite file, shared by every worker process.
+
+    Listing reads only the small metadata table; interval data lives in a
+    separate table and is read when a colormap is loaded. The last
+    snapshot_cache_size colormaps saved or loaded as snapshots stay in memory.
+    """
+
+    def __init__(self, path=DEFAULT_LIBRARY_PATH, snapshot_cache_size=32):
+        self.path = path
+        self.snapshot_cache_size = snapshot_cache_size
+        # name -> (created, snapshot, mincolormap, maxcolormap)
+        self._snapshots = OrderedDict()
+        self._snapshots_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA foreign_keys=ON")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM colormaps").fetchone()[0]
+
+    def __contains__(self, name):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM colormaps WHERE name = ?", (name,)).fetchone() is not None
+
+    def names(self):
+        """Return the names of the written colormaps in the order they were first saved."""
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(f"SELECT name FROM colormaps WHERE {WRITTEN} ORDER BY id")]
+
+    def list(self):
+        """Return the metadata of every written colormap, without its interval data.
+
+        Names reserved for a save that has not written its data yet are left out.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT name, mincolormap, maxcolormap, n_intervals, created FROM colormaps "
+                f"WHERE {WRITTEN} ORDER BY id"
+            )
+            return [
+                {"name": name, "mincolormap": lo, "maxcolormap": hi, "n_intervals": n, "created": created}
+                for name, lo, hi, n, created in rows
+            ]
+
+    def save(self, colormap, name=None):
+        """Store a {"data", "mincolormap", "maxcolormap"} colormap and return its name.
+
+        Without a name the colormap is numbered colormap_NN after its row id. Saving
+        under an existing name replaces that colormap.
+        """
+        data = colormap["data"]
+        return self._save(colormap["mincolormap"], colormap["maxcolormap"], len(data), json.dumps(data), name)[0]
+
+    def reserve(self, snapshot, mincolormap, maxcolormap, name=None):
+        """Add a colormap's name and metadata without its data and return the name.
+
+        The snapshot is kept in memory, so this process can load it at once;
+        save_snapshot() under the returned name writes the data.
+        """
+        name, created = self._save(mincolormap, maxcolormap, len(snapshot), None, name)
+        self._cache_snapshot(name, (created, snapshot, mincolormap, maxcolormap))
+        return name
+
+    def is_written(self, name):
+        """Return whether the colormap called name has its data stored."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM colormaps c JOIN colormap_data d ON d.id = c.id WHERE c.name = ?", (name,)
+            ).fetchone() is not None
+
+    def _save(self, mincolormap, maxcolormap, n_intervals, data, name):
+        created = time.time()
+        content_hash = None
+        if data is not None:
+            content_hash = hashlib.sha1(json.dumps([mincolormap, maxcolormap]).encode() + data.encode()).hexdigest()
+        metadata = (mincolormap, maxcolormap, n_intervals, created, content_hash)
+        with self._connect() as conn:
+            row = conn.execute("SELECT id FROM colormaps WHERE name = ?", (name,)).fetchone() if name else None
+            if row:
+                colormap_id = row[0]
+                conn.execute(
+                    "UPDATE colormaps SET mincolormap = ?, maxcolormap = ?, n_intervals = ?, created = ?, content_hash = ? "
+                    "WHERE id = ?",
+                    metadata + (colormap_id,),
+                )
+            else:
+                cursor = conn.execute(
+                    "INSERT INTO colormaps (name, mincolormap, maxcolormap, n_intervals, created, content_hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (name,) + metadata,
+                )
+                colormap_id = cursor.lastrowid
+                if name is None:
+                    name = f"colormap_{colormap_id:02d}"
+                    suffix = 1
+                    while conn.execute("SELECT 1 FROM colormaps WHERE name = ?", (name,)).fetchone():
+                        # An imported file already uses this number
+                        suffix += 1
+                        name = f"colormap_{colormap_id:02d}_{suffix}"
+                    conn.execute("UPDATE colormaps SET name = ? WHERE id = ?", (name, colormap_id))
+            if data is not None:
+                conn.execute("INSERT OR REPLACE INTO colormap_data (id, data) VALUES (?, ?)", (colormap_id, data))
+        return name, created
+
+    def load(self, name):
+        """Return the saved colormap called name, raising KeyError if there is none."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT c.mincolormap, c.maxcolormap, d.data FROM colormaps c "
+                "JOIN colormap_data d ON d.id = c.id WHERE c.name = ?",
+                (name,),
+            ).fetchone()
+        if row is None:
+            raise KeyError(name)
+        lo, hi, data = row
+        return {"data": json.loads(data), "mincolormap": lo, "maxcolormap": hi}
+
+    def save_snapshot(self, snapshot, mincolormap, maxcolormap, name=None):
+        """Store a ColormapSnapshot like save() and keep it for later load_snapshot() calls."""
+        name, created = self._save(mincolormap, maxcolormap, len(snapshot), json.dumps(snapshot.to_dicts()), name)
+        self._cache_snapshot(name, (created, snapshot, mincolormap, maxcolormap))
+        return name
+
+    def version(self, name):
+        """Return the time the colormap called name was last saved, raising KeyError if there is none.
+
+        Anything derived from a colormap can be cached under its name and version.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT created FROM colormaps WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+
+    def content_hash(self, name):
+        """Return a hash of the bounds and intervals of the colormap called name.
+
+        Colormaps with the same content share it. Raises KeyError if there is no
+        colormap called name or its data is not written yet.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT content_hash FROM colormaps WHERE name = ? AND content_hash IS NOT NULL", (name,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+
+    def load_snapshot(self, name):
+        """Return (snapshot, mincolormap, maxcolormap), reusing the in-memory copy when current.
+
+        Raises KeyError if there is no colormap called name.
+        """
+        version = self.version(name)
+        with self._snapshots_lock:
+            cached = self._snapshots.get(name)
+            if cached is not None and cached[0] == version:
+                # Another worker may have replaced it; the version tells
+                self._snapshots.move_to_end(name)
+                return cached[1:]
+        colormap = self.load(name)
+        snapshot = IntervalColormap.from_dicts(colormap["data"]).snapshot()
+        self._cache_snapshot(name, (version, snapshot, colormap["mincolormap"], colormap["maxcolormap"]))
+        return snapshot, colormap["mincolormap"], colormap["maxcolormap"]
+
+    def _cache_snapshot(self, name, item):
+        with self._snapshots_lock:
+            self._snapshots[name] = item
+            self._snapshots.move_to_end(name)
+            while len(self._snapshots) > self.snapshot_cache_size:
+                self._snapshots.popitem(last=False)
+
+    def delete(self, name):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM colormaps WHERE name = ?", (name,))
+
+    def import_files(self, paths):
+        """Add saved colormap JSON files, named after the file; return the names added.
+
+        Files that are not in the {"data", "mincolormap", "maxcolormap"} format,
+        or whose name is already taken, are skipped.
+        """
+        added = []
+        for path in paths:
+            name = os.path.splitext(os.path.basename(path))[0]
+            with open(path) as file:
+                colormap = json.load(file)
+            if not isinstance(colormap, dict) or "data" not in colormap or name in self:
+                continue
+            added.append(self.save(colormap, name))
+        return added
+
+
+class LibraryWriter:
+    """Writes colormap snapshots into a ColormapLibrary on a background thread.
+
+    save() reserves the name and returns at once. Saves waiting for the same
+    name are coalesced, so only the latest one is written. Each write is one
+    SQLite transaction, so a crash never leaves a half-written colormap.
+    """
+
+    def __init__(self, library):
+        self.library = library
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="colormap-writer")
+        self._lock = threading.Lock()
+        # name -> (snapshot, mincolormap, maxcolormap) still to be written
+        self._pending = {}
+        self._futures = {}
+        self._errors = {}
+
+    def save(self, snapshot, mincolormap, maxcolormap, name=None):
+        """Queue a snapshot for writing and return the name it is saved under."""
+        if name is None:
+            name = self.library.reserve(snapshot, mincolormap, maxcolormap)
+        with self._lock:
+            self._errors.pop(name, None)
+            queued = name in self._pending
+            self._pending[name] = (snapshot, mincolormap, maxcolormap)
+            if not queued:
+                self._futures[name] = self._executor.submit(self._write, name)
+        return name
+
+    def _write(self, name):
+        with self._lock:
+            snapshot, mincolormap, maxcolormap = self._pending.pop(name)
+        try:
+            self.library.save_snapshot(snapshot, mincolormap, maxcolormap, name)
+        except Exception as error:
+            with self._lock:
+                self._errors[name] = error
+            if not self.library.is_written(name):
+                self.library.delete(name)
+            raise
+
+    def status(self, name):
+        """Return "pending", "saved" or "failed" for a save, from any worker process.
+
+        A name reserved without data is pending while some worker may still write it;
+        a failed save removes the name, so a name missing from the library failed.
+        """
+        with self._lock:
+            if name in self._errors:
+                return "failed"
+            future = self._futures.get(name)
+            if future is not None and not future.done():
+                return "pending"
+            self._futures.pop(name, None)
+        if self.library.is_written(name):
+            return "saved"
+        return "pending" if name in self.library else "failed"
+
+    def flush(self, timeout=None):
+        """Wait until every queued save has been written."""
+        with self._lock:
+            futures = list(self._futures.values())
+        for future in futures:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
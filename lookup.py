@@ -0,0 +1,216 @@
+import numpy as np
+from colors import to_rgba
+from gradients import SPACES, Gradient, entry_color, from_space, gradient_position, to_space
+
+# Color used for NaN values and for values that fall in a gap between intervals
+TRANSPARENT = (0.0, 0.0, 0.0, 0.0)
+# Flat steps each gradient interval becomes in exports that only hold flat colors
+GRADIENT_STEPS = 32
+
+
+def colormap_bounds(colormap):
+    """Return (data, mincolormap, maxcolormap) for a saved colormap or a bare interval list."""
+    if isinstance(colormap, dict):
+        return colormap["data"], colormap["mincolormap"], colormap["maxcolormap"]
+    data = list(colormap)
+    return data, min(entry["min"] for entry in data), max(entry["max"] for entry in data)
+
+
+class CompiledColormap:
+    """Breakpoint and RGBA tables that color a whole array with one searchsorted.
+
+    Values in [mincolormap, maxcolormap] take the color of the interval containing
+    them (intervals are half-open, except that maxcolormap itself belongs to the
+    last one). Values below or above the bounds use ``under``/``over``, which
+    default to the first/last color. NaNs and values in gaps between intervals
+    use ``bad``. Values in gradient intervals are interpolated after the lookup.
+    """
+
+    def __init__(self, colormap, under=None, over=None, bad=TRANSPARENT):
+        data, lo, hi = colormap_bounds(colormap)
+        palette, palette_index, codes = [], {}, []
+        for entry in data:
+            color = entry_color(entry)
+            if color not in palette_index:
+                palette_index[color] = len(palette)
+                palette.append(color)
+            codes.append(palette_index[color])
+        starts = [entry["min"] for entry in data]
+        ends = [entry["max"] for entry in data]
+        self._build(starts, ends, codes, palette, lo, hi, under, over, bad)
+
+    @classmethod
+    def from_arrays(cls, starts, ends, codes, palette, mincolormap, maxcolormap, under=None, over=None, bad=TRANSPARENT):
+        """Compile intervals given as parallel starts, ends and palette codes, e.g. a BinaryColormap's."""
+        compiled = cls.__new__(cls)
+        compiled._build(starts, ends, codes, palette, mincolormap, maxcolormap, under, over, bad)
+        return compiled
+
+    def _build(self, starts, ends, codes, palette, lo, hi, under, over, bad):
+        if not hi > lo:
+            raise ValueError(f"maxcolormap ({hi}) must be greater than mincolormap ({lo})")
+        bad = to_rgba(bad)
+
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        codes = np.asarray(codes, dtype=np.intp)
+        if len(starts) > 1 and np.any(starts[1:] < starts[:-1]):
+            order = np.argsort(starts, kind="stable")
+            starts, ends, codes = starts[order], ends[order], codes[order]
+        # Clip to the bounds; an interval starts no earlier than the ones before it end
+        ends = np.minimum(ends, hi)
+        reached = np.maximum.accumulate(np.concatenate(([lo], ends[:-1])))
+        starts = np.maximum(starts, reached)
+        keep = ends > starts
+        starts, ends, codes = starts[keep], ends[keep], codes[keep]
+
+        # Bins are the intervals, a bad bin before each gap, and one after the last interval
+        gap = starts > np.concatenate(([lo], ends[:-1]))
+        position = np.arange(len(codes)) + np.cumsum(gap)
+        tail = not len(ends) or ends[-1] < hi
+        n_bins = len(codes) + int(gap.sum()) + tail
+        bin_codes = np.full(n_bins, -1, dtype=np.intp)
+        bin_codes[position] = codes
+        edges = np.empty(n_bins + 1)
+        edges[0] = lo
+        edges[position + 1] = ends
+        edges[position[gap]] = starts[gap]
+        if tail:
+            edges[-1] = hi
+
+        # Table rows start 1 after the bins; a gradient's flat row is its color at the bin start
+        is_gradient = np.array([isinstance(color, Gradient) for color in palette] + [False])
+        palette_rgba = np.array([bad if is_gradient[code] else to_rgba(color) for code, color in enumerate(palette)] + [bad])
+        rows = palette_rgba[bin_codes]  # code -1 picks the bad row at the end
+        gradients = {}
+        gradient_bins = np.flatnonzero(is_gradient[bin_codes])
+        if len(gradient_bins):
+            gradient_bins = gradient_bins[np.argsort(bin_codes[gradient_bins], kind="stable")]
+            split = np.flatnonzero(np.diff(bin_codes[gradient_bins])) + 1
+            for in_color in np.split(gradient_bins, split):
+                color = palette[bin_codes[in_color[0]]]
+                rows[in_color] = color(edges[in_color])
+                gradients.update(dict.fromkeys((in_color + 1).tolist(), color))
+            gradients = dict(sorted(gradients.items()))
+
+        self.mincolormap = lo
+        self.maxcolormap = hi
+        self.edges = edges
+        # Nudge the last edge so that maxcolormap itself lands in the last bin
+        self._search_edges = self.edges.copy()
+        self._search_edges[-1] = np.nextafter(self._search_edges[-1], np.inf)
+
+        # Row 0 is under, rows 1..n are the bins, then over, then bad
+        under = rows[0] if under is None else to_rgba(under)
+        if over is None:
+            over = gradients[n_bins]([hi])[0] if n_bins in gradients else rows[-1]
+        else:
+            over = to_rgba(over)
+        self.rgba = np.vstack([under, rows, over, bad])
+        self._bad_index = n_bins + 2
+        self._tables = {}
+
+        # Per-gradient arrays, indexed through the slot of each table row (-1 for flat rows)
+        self.gradients = gradients
+        self._gradient_slot = None
+        if gradients:
+            self._gradient_slot = np.full(len(self.rgba), -1, dtype=np.intp)
+            self._gradient_slot[list(gradients)] = np.arange(len(gradients))
+            ramps = list(gradients.values())
+            self._gradient_starts = np.array([g.start for g in ramps], dtype=np.float64)
+            self._gradient_ends = np.array([g.end for g in ramps], dtype=np.float64)
+            self._gradient_spaces = np.array([SPACES.index(g.space) for g in ramps])
+            first = np.array([to_rgba(g.color) for g in ramps])
+            last = np.array([to_rgba(g.end_color) for g in ramps])
+            self._gradient_alpha = (first[:, 3], last[:, 3])
+            self._gradient_coords = [
+                (to_space(first[:, :3], space), to_space(last[:, :3], space)) for space in SPACES
+            ]
+
+    def table(self, alpha=True, dtype=np.float64):
+        """Return the color table as floats in [0, 1], or 0-255 for integer dtypes."""
+        dtype = np.dtype(dtype)
+        key = (alpha, dtype)
+        table = self._tables.get(key)
+        if table is None:
+            table = self.rgba if alpha else self.rgba[:, :3]
+            if dtype.kind in "ui":
+                table = np.rint(table * 255)
+            table = np.ascontiguousarray(table, dtype=dtype)
+            self._tables[key] = table
+        return table
+
+    def indices(self, values):
+        """Return the color table row for every value."""
+        values = np.asarray(values)
+        index = np.searchsorted(self._search_edges, values, side="right")
+        if values.dtype.kind in "fc":
+            np.putmask(index, np.isnan(values), self._bad_index)
+        return index
+
+    def __call__(self, values, alpha=True, bytes=False, out=None):
+        """Color an N-dimensional array, returning shape values.shape + (4,) or (3,).
+
+        Colors are floats in [0, 1], or uint8 when bytes is True. When out is given
+        its dtype picks the table and the colors are written into it in place.
+        """
+        if out is not None:
+            dtype = out.dtype
+        else:
+            dtype = np.uint8 if bytes else np.float64
+        table = self.table(alpha, dtype)
+        index = self.indices(values)
+        if out is not None and out.shape != index.shape + table.shape[1:]:
+            raise ValueError(f"out has shape {out.shape}, expected {index.shape + table.shape[1:]}")
+        # Indices are always in range, so "clip" skips numpy's bounds-check buffering
+        out = np.take(table, index, axis=0, out=out, mode="clip")
+        if self._gradient_slot is not None:
+            self._interpolate(values, index, out)
+        return out
+
+    def _interpolate(self, values, index, out):
+        """Overwrite the colors of values that fall in gradient intervals."""
+        slot = self._gradient_slot[index]
+        mask = slot >= 0
+        if not mask.any():
+            return
+        slot = slot[mask]
+        t = gradient_position(np.asarray(values, dtype=np.float64)[mask], self._gradient_starts[slot], self._gradient_ends[slot])
+        rgba = np.empty((len(slot), 4))
+        spaces = self._gradient_spaces[slot]
+        for space_index, space in enumerate(SPACES):
+            in_space = spaces == space_index
+            if not in_space.any():
+                continue
+            first, last = self._gradient_coords[space_index]
+            k, u = slot[in_space], t[in_space, None]
+            rgba[in_space, :3] = from_space(first[k] + u * (last[k] - first[k]), space)
+        alpha_first, alpha_last = self._gradient_alpha
+        rgba[:, 3] = alpha_first[slot] + t * (alpha_last[slot] - alpha_first[slot])
+        rgba = rgba[:, :out.shape[-1]]
+        if out.dtype.kind in "ui":
+            rgba = np.rint(rgba * 255)
+        out[mask] = rgba
+
+    def steps(self, n=GRADIENT_STEPS):
+        """Return (edges, rgba) with every gradient bin cut into n flat steps.
+
+        Colors are taken at the step centers; flat bins are returned as they are.
+        """
+        edges, rows = [self.edges[:1]], []
+        for k in range(len(self.edges) - 1):
+            gradient = self.gradients.get(k + 1)
+            if gradient is None:
+                edges.append(self.edges[k + 1:k + 2])
+                rows.append(self.rgba[k + 1:k + 2])
+                continue
+            cuts = np.linspace(self.edges[k], self.edges[k + 1], n + 1)
+            edges.append(cuts[1:])
+            rows.append(gradient((cuts[:-1] + cuts[1:]) / 2))
+        return np.concatenate(edges), np.concatenate(rows)
+
+
+def apply_colormap(colormap, values, alpha=True, bytes=False, under=None, over=None, bad=TRANSPARENT, out=None):
+    """Color a NumPy array of values with a saved colormap."""
+    compiled = CompiledColormap(colormap, under=under, over=over, bad=bad)
+    return compiled(values, alpha=alpha, bytes=bytes, out=out)
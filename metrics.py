@@ -0,0 +1,189 @@
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import flask
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+INTERVAL_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+
+# name: (help text, buckets)
+HISTOGRAMS = {
+    "colormap_stage_seconds": ("Time spent in each stage of a Dash callback, by callback and stage.", LATENCY_BUCKETS),
+    "colormap_request_seconds": ("Total time of Dash callback requests.", LATENCY_BUCKETS),
+    "colormap_intervals": ("Number of intervals in the colormap after each callback.", INTERVAL_BUCKETS),
+    "colormap_response_bytes": ("Size of Dash callback responses.", BYTES_BUCKETS),
+}
+COUNTERS = {
+    "colormap_callbacks_total": "Callbacks handled, by trigger.",
+    "colormap_slow_profiles_total": "Slow callbacks written out as cProfile dumps.",
+}
+DASH_UPDATE_PATH = "/_dash-update-component"
+
+
+class Metrics:
+    """Thread-safe histograms and counters rendered in the Prometheus text format.
+
+    Values are per process; under several workers each one exposes its own.
+    When profile_threshold is set, callbacks run under cProfile (one at a time;
+    callbacks running alongside it are only timed) and those slower than
+    profile_threshold seconds are dumped to profile_dir.
+    """
+
+    def __init__(self, profile_threshold=None, profile_dir="profiles"):
+        self.profile_threshold = profile_threshold
+        self.profile_dir = profile_dir
+        self._lock = threading.Lock()
+        # Name of the instrumented callback running on each thread, for timer()
+        self._running = threading.local()
+        # Only one profiler can be active per process, so one callback is profiled at a time
+        self._profile_lock = threading.Lock()
+        # (name, labels) -> [bucket counts..., sum, count]
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, name, value, **labels):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(buckets) + 2)
+            for k, bound in enumerate(buckets):
+                if value <= bound:
+                    series[k] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, stage):
+        """Record the duration of the enclosed block as one stage of the running callback."""
+        callback = getattr(self._running, "callback", "")
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("colormap_stage_seconds", time.perf_counter() - start, callback=callback, stage=stage)
+
+    def instrument(self, func):
+        """Time a callback as its "callback" stage, profiling it if it is slow.
+
+        Stages are labelled with the callback's function name, here and in timer().
+        """
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = None
+            outer = getattr(self._running, "callback", "")
+            self._running.callback = func.__name__
+            start = time.perf_counter()
+            try:
+                if self.profile_threshold is not None:
+                    profiler = self._start_profile()
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self._running.callback = outer
+                self.observe("colormap_stage_seconds", elapsed, callback=func.__name__, stage="callback")
+                if flask.has_request_context():
+                    flask.g.callback_seconds = getattr(flask.g, "callback_seconds", 0) + elapsed
+                    flask.g.callback_name = func.__name__
+                if profiler is not None:
+                    profiler.disable()
+                    self._profile_lock.release()
+                    if elapsed > self.profile_threshold:
+                        self._dump_profile(profiler, func.__name__, elapsed)
+        return wrapper
+
+    def _start_profile(self):
+        """Return an enabled profiler, or None if another callback or tool is profiling."""
+        if not self._profile_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # A debugger or coverage tool already uses the profiling hook
+            self._profile_lock.release()
+            return None
+        return profiler
+
+    def _dump_profile(self, profiler, name, elapsed):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{name}_{time.strftime('%Y%m%d-%H%M%S')}_{elapsed * 1000:.0f}ms.prof")
+        profiler.dump_stats(path)
+        self.inc("colormap_slow_profiles_total")
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {key: list(series) for key, series in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (series_name, labels), series in sorted(histograms.items()):
+                if series_name != name:
+                    continue
+                for bound, count in zip(buckets, series):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', f'{bound:g}'),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {series[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {series[-2]:g}")
+                lines.append(f"{name}_count{_labels(labels)} {series[-1]}")
+        for name, help_text in COUNTERS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (series_name, labels), value in sorted(counters.items()):
+                if series_name == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+METRICS = Metrics()
+
+
+def register_metrics(app, metrics=METRICS):
+    """Time Dash callback requests, record response sizes and serve /metrics."""
+    server = app.server
+
+    @server.before_request
+    def start_timer():
+        flask.g.request_start = time.perf_counter()
+
+    @server.after_request
+    def record_request(response):
+        if flask.request.path.endswith(DASH_UPDATE_PATH) and hasattr(flask.g, "request_start"):
+            elapsed = time.perf_counter() - flask.g.request_start
+            metrics.observe("colormap_request_seconds", elapsed)
+            # Whatever is not callback time is mostly Dash (de)serializing the payload
+            metrics.observe(
+                "colormap_stage_seconds", max(0.0, elapsed - getattr(flask.g, "callback_seconds", 0)),
+                callback=getattr(flask.g, "callback_name", ""), stage="serialize",
+            )
+            if not response.direct_passthrough:
+                metrics.observe("colormap_response_bytes", len(response.get_data()))
+        return response
+
+    @server.route("/metrics")
+    def metrics_endpoint():
+        return flask.Response(metrics.render(), mimetype="text/plain; version=0.0.4")
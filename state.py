@@ -0,0 +1,411 @@
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from files import write_atomic
+from gradients import Gradient, entry_color, palette_from_json, palette_to_json
+from intervals import ColormapSnapshot, IntervalColormap
+
+DEFAULT_COLORMAP = [{"color": "white", "min": 0, "max": 100}]
+# Undo history limits per session: number of versions and estimated memory
+HISTORY_DEPTH = 100
+HISTORY_BYTES = 64 * 1024 * 1024
+# Estimated memory of the history DiskStore keeps, since it rewrites it on every request
+DISK_HISTORY_BYTES = 4 * 1024 * 1024
+# Rough memory of one interval held in a snapshot chunk: two floats and three tuple slots
+INTERVAL_BYTES = 72
+
+
+class ColormapState:
+    """Everything one browser session edits: the colormap, its bounds and background."""
+
+    def __init__(self, colormap_data=None, background_color="white", mincolormap=0, maxcolormap=100, history=None,
+                 viewport=None, last_save=None):
+        if colormap_data is None:
+            colormap_data = IntervalColormap.from_dicts(DEFAULT_COLORMAP)
+        if history is None:
+            history = EditHistory()
+        self.colormap_data = colormap_data
+        self.background_color = background_color
+        self.mincolormap = mincolormap
+        self.maxcolormap = maxcolormap
+        self.history = history
+        # Zoomed (min, max) range of the strip in colormap units, or None for the full range
+        self.viewport = viewport
+        # (content hash, name) of the last save, so saving again without any
+        # edit reuses that colormap, whichever worker handles the request
+        self.last_save = last_save
+
+    def to_colormap(self):
+        """Return the colormap in the saved {"data", "mincolormap", "maxcolormap"} format."""
+        return {
+            "data": self.colormap_data.to_dicts(),
+            "mincolormap": self.mincolormap,
+            "maxcolormap": self.maxcolormap,
+        }
+
+    def to_dict(self):
+        # The intervals are kept as parallel lists with their palette codes, since
+        # figure patches sent to the browser refer to cells by palette code
+        colormap_data = self.colormap_data
+        return {
+            "starts": colormap_data.starts,
+            "ends": colormap_data.ends,
+            "codes": colormap_data.codes,
+            "palette": palette_to_json(colormap_data.palette),
+            "background_color": self.background_color,
+            "mincolormap": self.mincolormap,
+            "maxcolormap": self.maxcolormap,
+            "viewport": self.viewport,
+            "history": self.history.to_dict(),
+            "last_save": self.last_save,
+        }
+
+    @classmethod
+    def from_dict(cls, state, max_depth=HISTORY_DEPTH, max_bytes=HISTORY_BYTES):
+        history = state.get("history")
+        return cls(
+            colormap_data=IntervalColormap(
+                state["starts"], state["ends"], state["codes"], palette_from_json(state["palette"])
+            ),
+            background_color=state["background_color"],
+            mincolormap=state["mincolormap"],
+            maxcolormap=state["maxcolormap"],
+            history=EditHistory.from_dict(history, max_depth, max_bytes) if history else EditHistory(max_depth, max_bytes),
+            viewport=state.get("viewport"),
+            last_save=tuple(state["last_save"]) if state.get("last_save") else None,
+        )
+
+
+class EditHistory:
+    """Bounded undo and redo stacks of colormap versions.
+
+    A version holds a ColormapSnapshot plus the background and bounds.
+    Consecutive snapshots share their unchanged chunks, so each version costs
+    memory in proportion to what its edit touched. The oldest versions are
+    dropped beyond max_depth versions or about max_bytes of intervals.
+    """
+
+    def __init__(self, max_depth=HISTORY_DEPTH, max_bytes=HISTORY_BYTES):
+        self.max_depth = max_depth
+        self.max_bytes = max_bytes
+        # [version, estimated bytes] pairs, the most recent last
+        self._undo = []
+        self._redo = []
+        self.nbytes = 0
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def record(self, state):
+        """Remember state as it is before an edit; this clears the redo stack."""
+        self.nbytes -= sum(cost for _, cost in self._redo)
+        self._redo.clear()
+        self._push(self._undo, state)
+        self._trim()
+
+    def undo(self, state):
+        """Restore the version before the last edit into state; return False if there is none."""
+        return self._step(self._undo, self._redo, state)
+
+    def redo(self, state):
+        """Restore the version the last undo left; return False if there is none."""
+        return self._step(self._redo, self._undo, state)
+
+    def _step(self, source, target, state):
+        if not source:
+            return False
+        self._push(target, state)
+        version, cost = source.pop()
+        self.nbytes -= cost
+        snapshot, state.background_color, state.mincolormap, state.maxcolormap = version
+        state.colormap_data = IntervalColormap.from_snapshot(snapshot)
+        self._trim()
+        return True
+
+    def _push(self, stack, state):
+        version = (state.colormap_data.snapshot(), state.background_color, state.mincolormap, state.maxcolormap)
+        cost = _snapshot_bytes(version[0], stack[-1][0][0] if stack else None)
+        stack.append([version, cost])
+        self.nbytes += cost
+
+    def to_dict(self):
+        """Return the versions as JSON; chunks shared between versions are written once."""
+        chunks, index = [], {}
+
+        def version_dict(version):
+            snapshot, background_color, mincolormap, maxcolormap = version
+            ids = []
+            for chunk in snapshot.chunks:
+                k = index.get(id(chunk))
+                if k is None:
+                    k = index[id(chunk)] = len(chunks)
+                    chunks.append(chunk)
+                ids.append(k)
+            return {
+                "chunks": ids,
+                "palette": palette_to_json(snapshot.palette),
+                "background_color": background_color,
+                "mincolormap": mincolormap,
+                "maxcolormap": maxcolormap,
+            }
+
+        undo = [version_dict(version) for version, _ in self._undo]
+        redo = [version_dict(version) for version, _ in self._redo]
+        return {"chunks": chunks, "undo": undo, "redo": redo}
+
+    @classmethod
+    def from_dict(cls, data, max_depth=HISTORY_DEPTH, max_bytes=HISTORY_BYTES):
+        """Rebuild a history from to_dict output, sharing chunks between versions again."""
+        history = cls(max_depth, max_bytes)
+        chunks = [(tuple(starts), tuple(ends), tuple(codes)) for starts, ends, codes in data["chunks"]]
+        for stack, versions in ((history._undo, data["undo"]), (history._redo, data["redo"])):
+            for version in versions:
+                snapshot = ColormapSnapshot([chunks[k] for k in version["chunks"]], palette_from_json(version["palette"]))
+                cost = _snapshot_bytes(snapshot, stack[-1][0][0] if stack else None)
+                stack.append([
+                    (snapshot, version["background_color"], version["mincolormap"], version["maxcolormap"]), cost
+                ])
+                history.nbytes += cost
+        history._trim()
+        return history
+
+    def _trim(self):
+        while self._undo and (len(self._undo) > self.max_depth or self.nbytes > self.max_bytes):
+            self._drop_oldest(self._undo)
+        while self._redo and self.nbytes > self.max_bytes:
+            self._drop_oldest(self._redo)
+
+    def _drop_oldest(self, stack):
+        self.nbytes -= stack.pop(0)[1]
+        if stack:
+            # The next version no longer shares chunks with a dropped one, so charge it in full
+            self.nbytes -= stack[0][1]
+            stack[0][1] = _snapshot_bytes(stack[0][0][0])
+            self.nbytes += stack[0][1]
+
+
+def _snapshot_bytes(snapshot, previous=None):
+    """Estimate the memory a snapshot adds on top of the previous one."""
+    shared = {id(chunk) for chunk in previous.chunks} if previous is not None else ()
+    intervals = sum(len(chunk[0]) for chunk in snapshot.chunks if id(chunk) not in shared)
+    return intervals * INTERVAL_BYTES + 8 * len(snapshot.chunks)
+
+
+def replace_background_color(state, new_bg_color):
+    """Replace the background color in the colormap and return the recolored indices."""
+    recolored = state.colormap_data.replace_color(state.background_color, new_bg_color)
+    state.background_color = new_bg_color
+    return recolored
+
+
+def update_intervals(state, new_color, new_min, new_max):
+    """Update colormap intervals dynamically based on new input.
+
+    Returns (i, j, count): intervals [i, j) were replaced by count new ones at i.
+    """
+    return state.colormap_data.insert(new_color, new_min, new_max)
+
+
+def add_intervals(state, entries):
+    """Add a batch of (color, min, max) ranges; later ranges win where they overlap.
+
+    Returns (i, j, count) like update_intervals.
+    """
+    return state.colormap_data.insert_many(entries)
+
+
+def parse_interval_ranges(text):
+    """Read (color, min, max) ranges from CSV rows or JSON.
+
+    JSON may be a list of {"color", "min", "max"} dicts (with "gradient" for
+    ramps) or a saved colormap with a "data" list. CSV rows are color,min,max,
+    with an optional header.
+    Raises ValueError on anything else.
+    """
+    text = text.strip()
+    if text[:1] in ("[", "{"):
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get("data")
+        if not isinstance(data, list):
+            raise ValueError('expected a list of {"color", "min", "max"} ranges')
+        rows = []
+        for entry in data:
+            try:
+                rows.append((entry_color(entry), entry["min"], entry["max"]))
+            except (KeyError, TypeError, AttributeError):
+                raise ValueError(f"not a color range: {entry!r}") from None
+    else:
+        rows = [row for row in csv.reader(io.StringIO(text)) if row]
+        if rows and [cell.strip().lower() for cell in rows[0]] == ["color", "min", "max"]:
+            rows = rows[1:]
+    return check_ranges(rows)
+
+
+def check_ranges(rows):
+    """Return rows of color, min, max as (color, min, max) tuples with numeric bounds.
+
+    Raises ValueError naming the first bad row.
+    """
+    ranges = []
+    for line_number, row in enumerate(rows, 1):
+        if len(row) != 3:
+            raise ValueError(f"range {line_number}: expected color, min, max")
+        color, lo, hi = row
+        try:
+            lo, hi = _number(lo), _number(hi)
+        except ValueError:
+            raise ValueError(f"range {line_number}: min and max must be numbers") from None
+        if not (math.isfinite(lo) and math.isfinite(hi)):
+            raise ValueError(f"range {line_number}: min and max must be finite")
+        if not isinstance(color, Gradient):
+            color = str(color).strip()
+        if not color:
+            raise ValueError(f"range {line_number}: missing color")
+        if lo > hi:
+            raise ValueError(f"range {line_number}: min {lo} is greater than max {hi}")
+        ranges.append((color, lo, hi))
+    return ranges
+
+
+def _number(value):
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, (int, float)):
+        return value
+    value = str(value).strip()
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def trim_and_expand_colormap(state, new_mincolormap, new_maxcolormap):
+    """Trim or expand the colormap based on new bounds."""
+    state.colormap_data.trim_and_expand(new_mincolormap, new_maxcolormap, state.background_color)
+
+
+def preview_data(state, max_intervals=None):
+    """Return the intervals the clientside preview (assets/preview.js) edits.
+
+    Returns None when the colormap has more than max_intervals intervals.
+    """
+    colormap_data = state.colormap_data
+    if max_intervals is not None and len(colormap_data) > max_intervals:
+        return None
+    return {
+        "starts": colormap_data.starts,
+        "ends": colormap_data.ends,
+        "codes": colormap_data.codes,
+        "palette": palette_to_json(colormap_data.palette),
+        "mincolormap": state.mincolormap,
+        "maxcolormap": state.maxcolormap,
+        "background": state.background_color,
+    }
+
+
+class MemoryStore:
+    """Per-process session store with LRU and time-to-live eviction.
+
+    Only suitable for a single worker process; use DiskStore when the app runs
+    under several processes.
+    """
+
+    def __init__(self, max_sessions=1000, ttl=3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        with self._lock:
+            item = self._sessions.get(session_id)
+            if item is None:
+                return None
+            state, last_used = item
+            if time.monotonic() - last_used > self.ttl:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return state
+
+    def save(self, session_id, state):
+        with self._lock:
+            now = time.monotonic()
+            self._sessions[session_id] = (state, now)
+            self._sessions.move_to_end(session_id)
+            # Expired sessions are the least recently used, so they sit at the front
+            while self._sessions:
+                oldest_id, (_, last_used) = next(iter(self._sessions.items()))
+                if len(self._sessions) <= self.max_sessions and now - last_used <= self.ttl:
+                    break
+                del self._sessions[oldest_id]
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class DiskStore:
+    """Session store with one JSON file per session, shared by every worker process.
+
+    Files are replaced atomically, and sessions untouched for longer than ttl
+    seconds are deleted on load and by a periodic sweep. The undo history is
+    written with the session, limited to about history_bytes of intervals.
+    """
+
+    def __init__(self, directory, ttl=86400, sweep_interval=300, history_bytes=DISK_HISTORY_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.history_bytes = history_bytes
+        self._last_sweep = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id):
+        # Session ids come from the browser, so never use them as file names directly
+        digest = hashlib.sha1(str(session_id).encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def load(self, session_id):
+        path = self._path(session_id)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path) as file:
+                return ColormapState.from_dict(json.load(file), max_bytes=self.history_bytes)
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, session_id, state):
+        write_atomic(self._path(session_id), json.dumps(state.to_dict()).encode())
+        if time.monotonic() - self._last_sweep > self.sweep_interval:
+            self.evict_expired()
+
+    def delete(self, session_id):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def evict_expired(self):
+        """Delete session files (and leftover temp files) older than the time-to-live."""
+        self._last_sweep = time.monotonic()
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.endswith((".json", ".tmp")) and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
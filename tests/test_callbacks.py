@@ -0,0 +1,177 @@
+"""Figures built by the update_colormap callback, called directly with a fake trigger."""
+import base64
+import inspect
+import json
+import random
+from types import SimpleNamespace
+
+import plotly
+import pytest
+from dash import Dash, Patch, no_update
+import callbacks
+from callbacks import SINGLE_TRACE_THRESHOLD, generate_colormap
+from gradients import Gradient
+from intervals import IntervalColormap
+from layout import create_layout
+from library import ColormapLibrary
+from state import DiskStore, MemoryStore
+
+# Inputs of update_colormap left at what the page sends before any click
+DEFAULTS = dict(
+    n_clicks_add=0, n_clicks_save=0, n_clicks_reset=0, selected_colormap=None, new_bg_color="white",
+    n_clicks_apply_bounds=0, n_clicks_undo=0, n_clicks_redo=0, relayout_data=None, upload_contents=None,
+    upload_filename=None, color=None, end_color=None, gradient_space="rgb", min_range=None, max_range=None,
+    new_mincolormap=0, new_maxcolormap=100, session_id="session",
+)
+
+
+@pytest.fixture(params=["memory", "disk"])
+def store(request, tmp_path):
+    return MemoryStore() if request.param == "memory" else DiskStore(str(tmp_path / "sessions"))
+
+
+@pytest.fixture
+def update_colormap(store, tmp_path, monkeypatch):
+    """Return call(trigger, **inputs), running update_colormap as if trigger had fired."""
+    app = Dash(__name__)
+    app.layout = create_layout
+    callbacks.register_callbacks(app, store, ColormapLibrary(str(tmp_path / "colormaps.db")))
+    # Dash wraps each callback; clientside ones have no Python function
+    functions = [callback["callback"].__wrapped__ for callback in app.callback_map.values() if "callback" in callback]
+    (func,) = [function for function in functions if function.__name__ == "update_colormap"]
+    names = inspect.signature(func).parameters
+
+    def call(trigger, **inputs):
+        monkeypatch.setattr(callbacks, "ctx", SimpleNamespace(triggered_id=trigger))
+        args = {name: value for name, value in DEFAULTS.items() if name in names}
+        args.update(inputs)
+        return func(**args)
+
+    return call
+
+
+def covered_gradient_colormap():
+    colormap = IntervalColormap()
+    colormap.insert("white", 0, 100)
+    colormap.insert(Gradient("red", "blue", 10, 20), 10, 20)
+    colormap.insert("green", 5, 25)
+    for k in range(SINGLE_TRACE_THRESHOLD + 50):
+        colormap.insert("red", 30 + k * 0.2, 30 + k * 0.2 + 0.1)
+    return colormap
+
+
+def test_painted_over_gradient_is_not_drawn():
+    colormap = covered_gradient_colormap()
+    assert not colormap.has_gradients()
+    figure = generate_colormap(colormap, 0, 100)
+    assert len(figure.data) == 1
+
+
+def add(update_colormap, color, lo, hi, end_color=None):
+    return update_colormap("add-color-btn", color=color, min_range=lo, max_range=hi, end_color=end_color)[0]
+
+
+def upload(update_colormap, rows):
+    contents = "data:text/csv;base64," + base64.b64encode("\n".join(rows).encode()).decode()
+    return update_colormap("intervals-upload", upload_contents=contents, upload_filename="ranges.csv")[0]
+
+
+def test_covering_the_last_gradient_redraws_the_strip(update_colormap):
+    update_colormap(None)
+    upload(update_colormap, [f"red,{30 + k * 0.2},{30 + k * 0.2 + 0.1}" for k in range(SINGLE_TRACE_THRESHOLD + 50)])
+    figure = add(update_colormap, "red", 10, 20, end_color="blue")
+    assert not isinstance(figure, Patch)
+    assert len(figure.data) == 2
+
+    # The overlay trace must go, which a patch of the first trace cannot do
+    figure = add(update_colormap, "green", 5, 25)
+    assert not isinstance(figure, Patch)
+    assert len(figure.data) == 1
+
+    # Without gradients before or after, adds are patched again
+    assert isinstance(add(update_colormap, "blue", 60, 61), Patch)
+
+
+def to_json(figure):
+    return json.loads(json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder))
+
+
+def apply_patch(figure, patch):
+    """Apply the operations of a Dash Patch to a figure dict, as the browser does."""
+    for operation in to_json(patch.to_plotly_json())["operations"]:
+        *path, last = operation["location"]
+        node = figure
+        for key in path:
+            node = node[key]
+        if operation["operation"] == "Assign":
+            node[last] = operation["params"]["value"]
+        elif operation["operation"] == "Delete":
+            del node[last]
+        elif operation["operation"] == "Insert":
+            node[last].insert(operation["params"]["index"], operation["params"]["value"])
+        else:
+            raise ValueError(operation["operation"])
+    return figure
+
+
+def apply_output(figure, output):
+    """Return the figure the browser shows after receiving output."""
+    if isinstance(output, Patch):
+        return apply_patch(figure, output)
+    return figure if output is no_update else to_json(output)
+
+
+def cell_colors(figure):
+    """Return the x edges and color of every cell or line the strip draws."""
+    cells = []
+    for trace in figure["data"]:
+        if trace["type"] == "heatmap":
+            colorscale = trace["colorscale"]
+            colors = [None if code is None else colorscale[2 * code][1] for code in trace["z"][0]]
+            cells.append((trace["x"], colors))
+        else:
+            cells.append((trace["x"], trace["line"]["color"]))
+    return cells
+
+
+def test_patches_match_full_redraws(update_colormap, store):
+    figure = to_json(update_colormap(None)[0])
+    # Start just under SINGLE_TRACE_THRESHOLD, listing colors high to low so that
+    # the palette is not in the order the intervals are
+    rows = [f"{['blue', 'green', 'red'][k % 3]},{99 - k},{99.5 - k}" for k in range(SINGLE_TRACE_THRESHOLD // 2 - 5)]
+    figure = apply_output(figure, upload(update_colormap, rows))
+
+    # Small adds cross the threshold; background changes recolor cells in place.
+    # Gradients are left out as they force redraws.
+    rng = random.Random(0)
+    for step in range(80):
+        if rng.random() < 0.05:
+            output = update_colormap("background-color-dropdown", new_bg_color=rng.choice(["white", "black", "gray"]))
+        else:
+            lo = rng.uniform(0, 99)
+            hi = lo + (rng.uniform(0, 20) if rng.random() < 0.02 else rng.choice([0, 0.05, 0.1]))
+            output = update_colormap("add-color-btn", color=rng.choice(["red", "green", "blue"]), min_range=lo, max_range=hi)
+        figure = apply_output(figure, output[0])
+        state = store.load("session")
+        expected = to_json(generate_colormap(state.colormap_data, state.mincolormap, state.maxcolormap))
+        assert cell_colors(figure) == cell_colors(expected), f"step {step}"
+
+
+def test_saving_twice_reuses_the_saved_colormap(update_colormap):
+    update_colormap(None)
+    add(update_colormap, "red", 10, 20)
+    first = update_colormap("save-colormap-btn")[3]
+    assert first.startswith("Saving ")
+    name = first[len("Saving "):-len("...")]
+    assert update_colormap("save-colormap-btn")[3] == f"{name} already saved"
+    add(update_colormap, "blue", 10, 20)
+    assert update_colormap("save-colormap-btn")[3] != f"{name} already saved"
+
+
+def test_empty_bounds_are_rejected(update_colormap):
+    update_colormap(None)
+    output = update_colormap("apply-bounds-btn", new_mincolormap=50, new_maxcolormap=50)
+    assert output[3] == "Bounds min 50 must be less than max 50"
+    # The inputs go back to the bounds in use, and later edits still work
+    assert output[6:8] == (0, 100)
+    assert isinstance(add(update_colormap, "red", 10, 20), Patch)
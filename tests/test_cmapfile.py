@@ -0,0 +1,55 @@
+import json
+
+import numpy as np
+import pytest
+from cmapfile import load_colormap, read_cmap, write_cmap
+from intervals import IntervalColormap
+from lookup import CompiledColormap
+
+COLORMAP = {
+    "data": [
+        {"color": "red", "min": 0, "max": 2.5},
+        {"color": "blue", "min": 2.5, "max": 4},
+        {"color": "green", "min": 4.0, "max": 10, "gradient": {"end_color": "yellow", "start": 4.0, "end": 10, "space": "oklab"}},
+    ],
+    "mincolormap": 0,
+    "maxcolormap": 10,
+}
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "colormap.cmap")
+    write_cmap(COLORMAP, path)
+    return path
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_round_trip_keeps_ints_and_floats(path, mmap):
+    colormap = read_cmap(path, mmap=mmap).to_colormap()
+    # Compared as JSON, so 0 and 0.0 differ
+    assert json.dumps(colormap) == json.dumps(COLORMAP)
+    assert json.dumps(load_colormap(path)) == json.dumps(COLORMAP)
+
+
+def test_interval_colormap(path):
+    assert read_cmap(path).to_interval_colormap() == IntervalColormap.from_dicts(COLORMAP["data"])
+
+
+def test_compile_matches_json(path):
+    values = np.linspace(-1, 11, 121)
+    assert np.array_equal(read_cmap(path).compile()(values), CompiledColormap(COLORMAP)(values))
+
+
+def test_empty_colormap(tmp_path):
+    path = str(tmp_path / "empty.cmap")
+    empty = {"data": [], "mincolormap": 0, "maxcolormap": 1}
+    write_cmap(empty, path)
+    assert read_cmap(path).to_colormap() == empty
+
+
+def test_not_a_cmap_file(tmp_path):
+    path = tmp_path / "colormap.cmap"
+    path.write_text(json.dumps(COLORMAP))
+    with pytest.raises(ValueError):
+        read_cmap(str(path))
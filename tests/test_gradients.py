@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from gradients import Gradient, entry_color, from_space, interval_dict, palette_from_json, palette_to_json, to_space
+
+
+@pytest.mark.parametrize("space", ["rgb", "oklab"])
+def test_space_round_trip(space):
+    rgb = np.random.default_rng(0).random((100, 3))
+    assert np.allclose(from_space(to_space(rgb, space), space), rgb, atol=1e-9)
+
+
+@pytest.mark.parametrize("space", ["rgb", "oklab"])
+def test_gradient_ends_and_clipping(space):
+    gradient = Gradient("red", "#0000ff80", 10, 20, space)
+    colors = gradient([0, 10, 20, 30])
+    assert np.allclose(colors[:2], [1, 0, 0, 1])
+    assert np.allclose(colors[2:], [0, 0, 1, 128 / 255])
+
+
+def test_oklab_midpoint_differs_from_rgb():
+    rgb = Gradient("red", "blue", 0, 1, "rgb")([0.5])[0]
+    oklab = Gradient("red", "blue", 0, 1, "oklab")([0.5])[0]
+    assert np.allclose(rgb, [0.5, 0, 0.5, 1])
+    assert not np.allclose(rgb, oklab)
+
+
+def test_zero_width_gradient_is_its_start_color():
+    assert np.allclose(Gradient("red", "blue", 5, 5)([4, 5, 6]), [1, 0, 0, 1])
+
+
+def test_invalid_gradients():
+    with pytest.raises(ValueError):
+        Gradient("red", "blue", 0, 1, "hsv")
+    with pytest.raises(ValueError):
+        Gradient("red", "blue", 2, 1)
+
+
+def test_json_round_trip():
+    gradient = Gradient("red", "blue", 0, 2.5, "oklab")
+    assert entry_color(interval_dict(gradient, 0, 1)) == gradient
+    assert entry_color(interval_dict("red", 0, 1)) == "red"
+    palette = ["white", gradient, "red"]
+    assert palette_from_json(palette_to_json(palette)) == palette
+
+
+def test_rescale():
+    assert Gradient("red", "blue", 10, 20).rescale(0, 40) == Gradient("red", "blue", 0.25, 0.5)
@@ -0,0 +1,48 @@
+"""The core modules, used by the CLI tools and worker processes, must start fast.
+
+Each one is imported in a fresh interpreter and checked not to pull in the UI
+stack. Wall-clock times vary too much on shared machines to check by default;
+set CHECK_IMPORT_TIME=1 to also hold each import to IMPORT_BUDGET.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from conftest import ROOT
+
+CORE_MODULES = ["intervals", "colors", "gradients", "state", "library", "lookup", "export", "thumbnails", "evaluate", "cmapfile", "batch", "colorize", "files"]
+UI_PACKAGES = ["dash", "plotly", "flask", "matplotlib"]
+# Seconds a cold import of one core module may take
+IMPORT_BUDGET = 0.25
+
+
+def import_time(module, repeat=3):
+    """Return the best cold import time of module and the UI packages it loaded."""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "seconds = time.perf_counter() - start\n"
+        f"print(json.dumps([seconds, [p for p in {UI_PACKAGES!r} if p in sys.modules]]))\n"
+    )
+    seconds = float("inf")
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        elapsed, loaded = json.loads(output)
+        seconds = min(seconds, elapsed)
+    return seconds, loaded
+
+
+@pytest.mark.parametrize("module", CORE_MODULES)
+def test_core_module_skips_ui(module):
+    _, loaded = import_time(module, repeat=1)
+    assert not loaded, f"{module} imports {', '.join(loaded)}"
+
+
+@pytest.mark.skipif(not os.environ.get("CHECK_IMPORT_TIME"), reason="set CHECK_IMPORT_TIME=1 to time imports")
+@pytest.mark.parametrize("module", CORE_MODULES)
+def test_core_module_imports_fast(module):
+    seconds, _ = import_time(module)
+    assert seconds <= IMPORT_BUDGET, f"{module} took {seconds * 1000:.0f} ms, over the {IMPORT_BUDGET * 1000:.0f} ms budget"
@@ -0,0 +1,65 @@
+"""IntervalColormap.insert_many must give exactly what inserting one range at a time gives."""
+import random
+
+import pytest
+from gradients import Gradient
+from intervals import IntervalColormap
+
+COLORS = ["red", "green", "blue", "black", Gradient("red", "blue", 0, 40), Gradient("white", "black", 10, 20, "oklab")]
+
+
+def random_bound(rng):
+    # Ints, floats with integral values and halves, so bounds often coincide
+    r = rng.random()
+    if r < 0.5:
+        return rng.randint(0, 40)
+    if r < 0.8:
+        return float(rng.randint(0, 40))
+    return rng.randint(0, 80) / 2
+
+
+def random_ranges(rng, count):
+    """Return count (color, min, max) ranges, about one in seven of them zero-width."""
+    ranges = []
+    for _ in range(count):
+        lo = random_bound(rng)
+        hi = lo if rng.random() < 0.15 else max(lo, random_bound(rng))
+        ranges.append((rng.choice(COLORS), lo, hi))
+    return ranges
+
+
+def random_cases(seed, trials=2000):
+    rng = random.Random(seed)
+    for _ in range(trials):
+        colormap = IntervalColormap()
+        for entry in random_ranges(rng, rng.randint(0, 12)):
+            colormap.insert(*entry)
+        yield colormap, random_ranges(rng, rng.randint(0, 10))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_insert_many_matches_sequential_inserts(seed):
+    for colormap, batch in random_cases(seed):
+        expected = colormap.copy()
+        for entry in batch:
+            expected.insert(*entry)
+        bulk = colormap.copy()
+        span = bulk.insert_many(batch)
+        # Values are compared, so 1 and 1.0 are the same bound
+        assert list(bulk) == list(expected), (list(colormap), batch)
+        if span is not None:
+            i, j, count = span
+            assert len(colormap) - (j - i) + count == len(bulk)
+            assert list(bulk)[:i] == list(colormap)[:i]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_insert_many_merge_matches_merge_runs(seed):
+    for colormap, batch in random_cases(seed):
+        expected = colormap.copy()
+        for entry in batch:
+            expected.insert(*entry)
+        expected.merge_runs()
+        merged = colormap.copy()
+        assert merged.insert_many(batch, merge=True) is None
+        assert list(merged) == list(expected), (list(colormap), batch)
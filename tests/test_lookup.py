@@ -0,0 +1,74 @@
+import random
+
+import numpy as np
+import pytest
+from gradients import Gradient, entry_color
+from lookup import CompiledColormap, apply_colormap
+
+RED, BLUE, CLEAR = [1, 0, 0, 1], [0, 0, 1, 1], [0, 0, 0, 0]
+
+
+def test_bounds_gaps_and_nan():
+    colormap = {
+        "data": [{"color": "red", "min": 0, "max": 4}, {"color": "blue", "min": 6, "max": 10}],
+        "mincolormap": 0,
+        "maxcolormap": 10,
+    }
+    colors = apply_colormap(colormap, [-1, 0, 3.9, 5, 6, 10, 11, np.nan])
+    assert np.array_equal(colors, [RED, RED, RED, CLEAR, BLUE, BLUE, BLUE, CLEAR])
+    colors = apply_colormap(colormap, [-1, 11], under="white", over="black")
+    assert np.array_equal(colors, [[1, 1, 1, 1], [0, 0, 0, 1]])
+
+
+def test_bytes_and_out():
+    compiled = CompiledColormap({"data": [{"color": "red", "min": 0, "max": 1}], "mincolormap": 0, "maxcolormap": 1})
+    out = np.empty((2, 2, 3), dtype=np.uint8)
+    compiled(np.zeros((2, 2)), alpha=False, out=out)
+    assert (out == [255, 0, 0]).all()
+    with pytest.raises(ValueError):
+        compiled(np.zeros(3), out=out)
+
+
+def test_empty_bounds():
+    with pytest.raises(ValueError):
+        CompiledColormap({"data": [], "mincolormap": 1, "maxcolormap": 1})
+
+
+def test_gradient_intervals_are_interpolated():
+    gradient = Gradient("red", "blue", 0, 10)
+    colormap = {"data": [{"color": "red", "min": 5, "max": 10, "gradient": gradient.to_json()}], "mincolormap": 0, "maxcolormap": 10}
+    values = np.array([5, 7.5, 10])
+    assert np.allclose(apply_colormap(colormap, values), gradient(values))
+    assert np.allclose(apply_colormap(colormap, [11]), BLUE)
+
+
+def random_colormap(rng):
+    data = []
+    for _ in range(rng.randint(0, 10)):
+        lo = rng.choice([rng.randint(-5, 25), rng.uniform(-5, 25)])
+        hi = lo + rng.choice([0, rng.randint(0, 8), rng.uniform(0, 8)])
+        entry = {"color": rng.choice(["red", "blue", "#00ff0080"]), "min": lo, "max": hi}
+        if rng.random() < 0.3:
+            entry["gradient"] = {"end_color": "yellow", "start": lo, "end": hi, "space": rng.choice(["rgb", "oklab"])}
+        data.append(entry)
+    return {"data": data, "mincolormap": 0, "maxcolormap": 20}
+
+
+def test_from_arrays_matches_dicts():
+    rng = random.Random(0)
+    values = np.linspace(-2, 22, 241)
+    for _ in range(300):
+        colormap = random_colormap(rng)
+        palette = []
+        codes = []
+        for entry in colormap["data"]:
+            color = entry_color(entry)
+            if color not in palette:
+                palette.append(color)
+            codes.append(palette.index(color))
+        compiled = CompiledColormap.from_arrays(
+            [entry["min"] for entry in colormap["data"]], [entry["max"] for entry in colormap["data"]], codes, palette, 0, 20
+        )
+        expected = CompiledColormap(colormap)
+        assert np.array_equal(compiled.edges, expected.edges)
+        assert np.array_equal(compiled(values), expected(values))
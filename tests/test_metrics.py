@@ -0,0 +1,43 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Metrics
+
+
+def test_stages_are_labelled_by_callback():
+    metrics = Metrics()
+
+    @metrics.instrument
+    def update_colormap():
+        with metrics.timer("load_state"):
+            pass
+
+    update_colormap()
+    with metrics.timer("load_state"):
+        pass
+    text = metrics.render()
+    assert 'colormap_stage_seconds_count{callback="update_colormap",stage="callback"} 1' in text
+    assert 'colormap_stage_seconds_count{callback="update_colormap",stage="load_state"} 1' in text
+    assert 'colormap_stage_seconds_count{callback="",stage="load_state"} 1' in text
+
+
+def test_concurrent_callbacks_are_profiled_one_at_a_time(tmp_path):
+    metrics = Metrics(profile_threshold=0, profile_dir=str(tmp_path))
+    barrier = threading.Barrier(4)
+
+    @metrics.instrument
+    def callback(k):
+        # Every call is running at once before any returns
+        barrier.wait(timeout=10)
+        return k
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(callback, range(4))) == list(range(4))
+    assert len(list(tmp_path.iterdir())) == 1
+    # The lock is free again afterwards
+    @metrics.instrument
+    def callback_alone():
+        pass
+
+    callback_alone()
+    assert len(list(tmp_path.iterdir())) == 2
@@ -0,0 +1,99 @@
+"""The browser preview in assets/preview.js must edit colormaps exactly like state.py.
+
+Random add and bounds edits are replayed through both, the JS side with node,
+and the intervals and normalized bounds are compared after every edit.
+"""
+import json
+import os
+import random
+import shutil
+import subprocess
+
+import pytest
+from conftest import ROOT
+from gradients import Gradient, palette_to_json
+from intervals import normalize_colormap
+from state import ColormapState, preview_data, trim_and_expand_colormap, update_intervals
+
+PREVIEW_SCRIPT = os.path.join(ROOT, "assets", "preview.js")
+COLORS = ["red", "blue", "green", "orange"]
+# Replays every edit sequence in node, printing the intervals and normalized bounds after each edit
+NODE_REPLAY = """
+const preview = require(process.argv[1]);
+const trials = JSON.parse(require("fs").readFileSync(0, "utf8"));
+const results = trials.map(function (trial) {
+    const colormap = preview.fromData(trial.data);
+    let lo = trial.data.mincolormap, hi = trial.data.maxcolormap;
+    return trial.edits.map(function (edit) {
+        if (edit[0] === "add") {
+            preview.insert(colormap, edit[1], edit[2], edit[3]);
+        } else {
+            lo = edit[1];
+            hi = edit[2];
+            preview.trimAndExpand(colormap, lo, hi, trial.data.background);
+        }
+        const normalized = preview.normalize(colormap, lo, hi);
+        return [preview.toDicts(colormap), normalized.map(function (e) { return [e.color, e.min, e.max]; })];
+    });
+});
+process.stdout.write(JSON.stringify(results));
+"""
+
+node = shutil.which("node")
+
+
+def random_edit(rng, lo, hi):
+    """Return a random ("add", color, min, max) or ("bounds", min, max) edit near [lo, hi]."""
+    def value():
+        x = rng.uniform(lo - 10, hi + 10)
+        return round(x) if rng.random() < 0.5 else round(x, rng.choice([1, 3, 15]))
+
+    if rng.random() < 0.15:
+        a, b = sorted((value(), value()))
+        return ("bounds", a, b + 1)
+    a, b = sorted((value(), value()))
+    if rng.random() < 0.1:
+        b = a
+    color = rng.choice(COLORS)
+    if rng.random() < 0.3:
+        color = Gradient(color, rng.choice(COLORS), a, b, rng.choice(["rgb", "oklab"]))
+    return ("add", color, a, b)
+
+
+def replay_in_python(rng, trials, edits):
+    """Return the JSON trials for node and, per trial, the Python result after each edit."""
+    payload, expected = [], []
+    for _ in range(trials):
+        state = ColormapState(background_color=rng.choice(["white", "black"]))
+        trial = {"data": json.loads(json.dumps(preview_data(state))), "edits": []}
+        steps = []
+        for _ in range(edits):
+            edit = random_edit(rng, state.mincolormap, state.maxcolormap)
+            if edit[0] == "add":
+                update_intervals(state, *edit[1:])
+                trial["edits"].append(["add", palette_to_json([edit[1]])[0], edit[2], edit[3]])
+            else:
+                state.mincolormap, state.maxcolormap = edit[1], edit[2]
+                trim_and_expand_colormap(state, state.mincolormap, state.maxcolormap)
+                trial["edits"].append(list(edit))
+            normalized = normalize_colormap(state.colormap_data, state.mincolormap, state.maxcolormap)
+            steps.append(json.loads(json.dumps([
+                [[palette_to_json([color])[0], start, end] for color, start, end in state.colormap_data],
+                [[palette_to_json([entry["color"]])[0], entry["min"], entry["max"]] for entry in normalized],
+            ])))
+        payload.append(trial)
+        expected.append(steps)
+    return payload, expected
+
+
+@pytest.mark.skipif(node is None, reason="node is needed to run assets/preview.js")
+def test_preview_matches_state():
+    payload, expected = replay_in_python(random.Random(0), trials=300, edits=25)
+    output = subprocess.run(
+        [node, "-e", NODE_REPLAY, PREVIEW_SCRIPT], input=json.dumps(payload), capture_output=True, text=True, check=True,
+    ).stdout
+    for k, (python_steps, js_steps) in enumerate(zip(expected, json.loads(output))):
+        assert len(js_steps) == len(python_steps)
+        for step, (python_result, js_result) in enumerate(zip(python_steps, js_steps)):
+            # JSON has one number type, so 10 and 10.0 compare equal here
+            assert js_result == python_result, f"trial {k} edit {step}: {payload[k]['edits'][step]}"
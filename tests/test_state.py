@@ -0,0 +1,37 @@
+from state import ColormapState, DiskStore, MemoryStore, update_intervals
+
+
+def edited_state():
+    state = ColormapState()
+    # Painting over red leaves it in the palette, unused
+    for color, lo, hi in [("red", 10, 20), ("blue", 0, 50), ("green", 60, 70.5)]:
+        state.history.record(state)
+        update_intervals(state, color, lo, hi)
+    return state
+
+
+def test_disk_store_keeps_palette_codes(tmp_path):
+    # Figure patches refer to heatmap cells by palette code, so a reload must not renumber them
+    state = edited_state()
+    store = DiskStore(str(tmp_path))
+    store.save("session", state)
+    loaded = store.load("session")
+    assert loaded.colormap_data.palette == state.colormap_data.palette
+    assert loaded.colormap_data.codes == state.colormap_data.codes
+    assert loaded.colormap_data.starts == state.colormap_data.starts
+    assert loaded.colormap_data.ends == state.colormap_data.ends
+
+
+def test_disk_store_keeps_undo_history(tmp_path):
+    state = edited_state()
+    store = DiskStore(str(tmp_path))
+    store.save("session", state)
+    loaded = store.load("session")
+    assert loaded.history.undo(loaded)
+    assert state.history.undo(state)
+    assert loaded.colormap_data == state.colormap_data
+
+
+def test_missing_session(tmp_path):
+    assert DiskStore(str(tmp_path)).load("missing") is None
+    assert MemoryStore().load("missing") is None
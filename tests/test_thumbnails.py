@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import flask
+import pytest
+from library import ColormapLibrary
+from thumbnails import ThumbnailCache, register_thumbnails
+
+RED = {"data": [{"color": "red", "min": 0, "max": 1}], "mincolormap": 0, "maxcolormap": 1}
+BLUE = {"data": [{"color": "blue", "min": 0, "max": 1}], "mincolormap": 0, "maxcolormap": 1}
+
+
+@pytest.fixture
+def library(tmp_path):
+    return ColormapLibrary(str(tmp_path / "colormaps.db"))
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return tmp_path / "thumbnails"
+
+
+@pytest.fixture
+def client(library, cache_dir):
+    app = SimpleNamespace(server=flask.Flask(__name__))
+    register_thumbnails(app, library, ThumbnailCache(str(cache_dir)))
+    return app.server.test_client()
+
+
+def test_cached_thumbnails_skip_loading(client, library, monkeypatch):
+    library.save(RED, "red")
+    first = client.get("/thumbnails/red.png")
+    assert first.status_code == 200 and first.data.startswith(b"\x89PNG")
+
+    def load(name):
+        raise AssertionError("loaded a colormap whose thumbnail is cached")
+
+    monkeypatch.setattr(library, "load", load)
+    assert client.get("/thumbnails/red.png").data == first.data
+
+
+def test_thumbnails_are_shared_by_content(client, library, cache_dir):
+    library.save(RED, "first")
+    library.save(RED, "second")
+    client.get("/thumbnails/first.png")
+    client.get("/thumbnails/second.png")
+    assert len(list(cache_dir.iterdir())) == 1
+    library.save(BLUE, "second")
+    assert client.get("/thumbnails/second.png").data != client.get("/thumbnails/first.png").data
+    assert len(list(cache_dir.iterdir())) == 2
+
+
+def test_missing_and_reserved_colormaps(client, library):
+    assert client.get("/thumbnails/missing.png").status_code == 404
+    name = library.reserve([], 0, 1)
+    assert client.get(f"/thumbnails/{name}.png").status_code == 404
@@ -0,0 +1,89 @@
+import os
+import struct
+import zlib
+from urllib.parse import quote
+
+import numpy as np
+from export import lookup_table
+from files import write_atomic
+
+DEFAULT_THUMBNAIL_DIR = "thumbnails"
+THUMBNAIL_WIDTH = 160
+THUMBNAIL_HEIGHT = 16
+THUMBNAIL_ROUTE = "/thumbnails"
+
+
+def encode_png(pixels):
+    """Encode an (height, width, 4) uint8 array as an RGBA PNG."""
+    height, width = pixels.shape[:2]
+    # Every scanline starts with filter type 0 (none)
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = pixels.reshape(height, width * 4)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 9))
+        + chunk(b"IEND", b"")
+    )
+
+
+def render_thumbnail(colormap, width=THUMBNAIL_WIDTH, height=THUMBNAIL_HEIGHT):
+    """Return a horizontal strip of the colormap as a PNG; gaps are transparent."""
+    row = lookup_table(colormap, n=width, alpha=True, bytes=True)
+    return encode_png(np.broadcast_to(row, (height, width, 4)))
+
+
+def thumbnail_url(name, created):
+    """Return the thumbnail URL of a saved colormap; it changes whenever the colormap is saved again."""
+    return f"{THUMBNAIL_ROUTE}/{quote(name, safe='')}.png?v={created:.6f}"
+
+
+class ThumbnailCache:
+    """PNG thumbnails on disk, named after the content hash of their colormap.
+
+    Identical colormaps share one file, and a colormap saved again under the
+    same name gets a new one. The hash is stored when the colormap is saved,
+    so a thumbnail already on disk is served without loading the colormap.
+    """
+
+    def __init__(self, directory=DEFAULT_THUMBNAIL_DIR, width=THUMBNAIL_WIDTH, height=THUMBNAIL_HEIGHT):
+        self.directory = directory
+        self.width = width
+        self.height = height
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, content_hash, load):
+        """Return the PNG bytes for a colormap's content hash, rendering the colormap load() returns on first use."""
+        path = os.path.join(self.directory, f"{content_hash}_{self.width}x{self.height}.png")
+        try:
+            with open(path, "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            pass
+        png = render_thumbnail(load(), self.width, self.height)
+        write_atomic(path, png)
+        return png
+
+
+def register_thumbnails(app, library, cache=None):
+    """Serve the thumbnail of each colormap in library at THUMBNAIL_ROUTE/<name>.png."""
+    import flask
+
+    if cache is None:
+        cache = ThumbnailCache()
+
+    @app.server.route(f"{THUMBNAIL_ROUTE}/<name>.png")
+    def thumbnail(name):
+        try:
+            # The hash is read from the metadata table; the data only on a cache miss
+            png = cache.get(library.content_hash(name), lambda: library.load(name))
+        except (KeyError, ValueError):
+            flask.abort(404)
+        response = flask.Response(png, mimetype="image/png")
+        # URLs carry the save time, so a cached image never goes stale
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response